@@ -1,37 +1,90 @@
 # import os
-# import json
-import io
-import base64
+import json
 import httpx
 import asyncio
 
-from anthropic import Anthropic
-from yandex_cloud_ml_sdk import YCloudML
-
 # from elevenlabs.client import ElevenLabs, VoiceSettings
 
 from loguru import logger
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 from functools import partial, wraps
 from telegram import Update
+from telegram.error import BadRequest
+from telegram import Bot
 from telegram.ext import ContextTypes
+from mltoolsbot import deadline
 from mltoolsbot.config import Config
-from mltoolsbot.redis import RedisClient
-
-redis_client = RedisClient()
-
-claude_client = Anthropic(api_key=Config.ANTHROPIC_TOKEN)
-claude_prompt = partial(
-    claude_client.messages.create,
-    model="claude-3-5-sonnet-20241022",
-    max_tokens=1024,
-    temperature=0,
+from mltoolsbot.exceptions import CircuitOpenError, RateLimitError, TimeoutError
+from mltoolsbot.redis import AsyncRedisClient
+from mltoolsbot.clients import HttpClients
+from mltoolsbot.cache import ResponseCache, TTLCache
+from mltoolsbot.history import ConversationHistory
+from mltoolsbot.images import compress_image, encoding_params, shutdown_pool
+from mltoolsbot.jobs import JobQueue, run_job_workers
+from mltoolsbot.scheduler import AdmissionController
+from mltoolsbot.streaming import stream_text
+from mltoolsbot.singleflight import SingleFlight
+from mltoolsbot.metrics import (
+    AUTH_CHECKS,
+    AUTH_SECONDS,
+    CACHE_HIT_RATE,
+    CIRCUIT_OPEN,
+    QUEUE_WAIT_SECONDS,
+    REQUEST_SECONDS,
+    REQUESTS,
+    REQUESTS_IN_FLIGHT,
+    start_server,
+)
+from mltoolsbot.providers import (
+    ClaudeProvider,
+    OllamaProvider,
+    Provider,
+    ProviderRegistry,
+    StableDiffusionProvider,
+    YandexArtProvider,
+    YandexGPTProvider,
 )
 
-ydx_client = YCloudML(folder_id=Config.YDX_FOLDER_ID, auth=Config.YDX_API_KEY)
-ydx_gpt = ydx_client.models.completions("yandexgpt").configure(temperature=0.5)
-ydx_art = ydx_client.models.image_generation("yandex-art").configure(
-    width_ratio=2, height_ratio=1
+redis_client = AsyncRedisClient()
+http_clients = HttpClients()
+auth_cache = TTLCache(maxsize=Config.AUTH_CACHE_SIZE, ttl=Config.AUTH_CACHE_TTL)
+background_tasks: set[asyncio.Task] = set()
+# Stop functions of running servers
+servers: dict[str, Callable[[], None]] = {}
+# Conversation history by backend
+histories = {
+    Config.CLAUDE: ConversationHistory(redis_client, "claude"),
+    Config.YDX_GPT: ConversationHistory(redis_client, "ydx"),
+}
+text_cache = ResponseCache(redis_client, "text")
+image_cache = ResponseCache(
+    redis_client,
+    "image",
+    ttl=Config.IMAGE_CACHE_TTL,
+    max_entries=Config.IMAGE_CACHE_MAX_ENTRIES,
+)
+single_flight = SingleFlight()
+image_jobs = JobQueue(redis_client)
+# Backend slots shared by update handlers and image job workers
+admission = AdmissionController()
+
+providers = ProviderRegistry()
+providers.register(ClaudeProvider())
+providers.register(YandexGPTProvider())
+providers.register(YandexArtProvider())
+providers.register(OllamaProvider(http_clients))
+providers.register(StableDiffusionProvider(http_clients))
+
+CACHE_HIT_RATE.labels(cache="auth").set_function(lambda: auth_cache.stats()["hit_rate"])
+CACHE_HIT_RATE.labels(cache="text").set_function(lambda: text_cache.stats()["hit_rate"])
+CACHE_HIT_RATE.labels(cache="image").set_function(
+    lambda: image_cache.stats()["hit_rate"]
 )
+for provider in providers:
+    CIRCUIT_OPEN.labels(backend=provider.name).set_function(
+        partial(lambda p: float(p.breaker.state != "closed"), provider)
+    )
 
 # elevenlabs_client = ElevenLabs(api_key=Config.TTS_TOKEN)
 # elevenlab_prompt = partial(
@@ -50,25 +103,167 @@ ydx_art = ydx_client.models.image_generation("yandex-art").configure(
 # )
 
 
-def with_timeout(timeout):
-    """Decorator to add timeout to async functions."""
+async def init_clients(application) -> None:
+    """Create shared backend clients on application startup."""
+    await http_clients.start()
+    if Config.METRICS_PORT and "metrics" not in servers:
+        servers["metrics"] = start_server(Config.METRICS_HOST, Config.METRICS_PORT)
+    if Config.AUTH_INVALIDATE_CHANNEL:
+        start_background(listen_auth_invalidation())
+    if any(provider.probed for provider in providers):
+        start_background(monitor_health())
+    if Config.IMAGE_JOBS and Config.JOB_WORKERS:
+        start_background(
+            run_job_workers(image_jobs, partial(process_image_job, application.bot))
+        )
+
+
+def start_background(coroutine) -> None:
+    """Run coroutine until the application shuts down."""
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    task.add_done_callback(log_failure)
+
+
+def log_failure(task: asyncio.Task) -> None:
+    """Report a background task that stopped with an error."""
+    if not task.cancelled() and task.exception() is not None:
+        logger.opt(exception=task.exception()).error(
+            f"Background task {task.get_coro().__name__} failed"
+        )
+
+
+async def close_clients(application) -> None:
+    """Release shared backend clients on application shutdown."""
+    for task in list(background_tasks):
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    for stop in servers.values():
+        # Waits for the serving thread to notice
+        await asyncio.to_thread(stop)
+    servers.clear()
+    await http_clients.close()
+    await redis_client.close()
+    # Waits for the image processes to exit
+    await asyncio.to_thread(shutdown_pool)
+
+
+def invalidate_auth(user_id: str) -> None:
+    """Drop cached authorization for user, "*" drops all users."""
+    logger.info(f"Invalidate auth cache for {user_id}")
+    if user_id == "*":
+        auth_cache.clear()
+    else:
+        auth_cache.pop(user_id)
+
+
+async def listen_auth_invalidation() -> None:
+    """Keep auth cache in sync with invalidation messages published to Redis."""
+    while True:
+        try:
+            await redis_client.listen(Config.AUTH_INVALIDATE_CHANNEL, invalidate_auth)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Messages may have been missed while disconnected
+            logger.error(f"Auth invalidation listener failed: {e}")
+            auth_cache.clear()
+            await asyncio.sleep(5)
+
+
+async def monitor_health() -> None:
+    """Probe backends with health checks, their circuits follow the result."""
+    while True:
+        probed = [provider for provider in providers if provider.probed]
+        await asyncio.gather(*(provider.probe() for provider in probed))
+        await asyncio.sleep(Config.HEALTH_CHECK_INTERVAL)
+
+
+def with_timeout(timeout: Optional[float]):
+    """Decorator to add timeout to async functions, bounded by the update deadline."""
 
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            try:
-                return await asyncio.wait_for(func(*args, **kwargs), timeout=timeout)
-            except asyncio.TimeoutError:
-                logger.warning(
-                    f"Operation timed out after {timeout} seconds: {func.__name__}"
-                )
-                raise TimeoutError(f"Operation timed out: {func.__name__}")
+            async with deadline.timeout(timeout, func.__name__):
+                return await func(*args, **kwargs)
 
         return wrapper
 
     return decorator
 
 
+@with_timeout(Config.AUTH_TIMEOUT)
+async def get_auth(user_id: str) -> Any:
+    """Return user's auth record, served from the in-process cache if possible."""
+    value = auth_cache.get(user_id)
+    if value is None:
+        # Redis errors are raised, not cached as an unauthorized user
+        value = await redis_client.get_value(user_id, raise_errors=True) or False
+        ttl = Config.AUTH_CACHE_TTL if value else Config.AUTH_CACHE_NEGATIVE_TTL
+        auth_cache.set(user_id, value, ttl=ttl)
+    return value or None
+
+
+async def get_weight(user_id: str) -> float:
+    """Fair queuing weight of user, from the "weight" of their auth record."""
+    try:
+        value = await get_auth(user_id)
+    except Exception as e:
+        logger.error(f"Weight of user {user_id} not available: {e}")
+        return 1.0
+    if isinstance(value, dict):
+        return float(value.get("weight", 1))
+    return 1.0
+
+
+@asynccontextmanager
+async def admit_request(
+    user_id: str,
+    backend: str,
+    on_queued: Optional[Callable[[int], Awaitable]] = None,
+) -> AsyncIterator[float]:
+    """
+    Admit a bot request for backend by the user's rate and fair share.
+    Queued image jobs only count against the rate here, their worker waits
+    for the backend slot.
+    """
+    kind = providers.get(backend).kind
+    if kind == "image" and Config.IMAGE_JOBS:
+        async with admission.admit(user_id, None) as wait:
+            yield wait
+        return
+    weight = await get_weight(user_id)
+    async with admission.admit(
+        user_id, backend, on_queued, kind=kind, weight=weight
+    ) as wait:
+        QUEUE_WAIT_SECONDS.labels(backend=backend, kind=kind).observe(wait)
+        yield wait
+
+
+async def send_cached_photo(bot: Bot, chat_id: int, cache_key: str) -> Optional[str]:
+    """Send previously uploaded image by its file_id if prompt was seen before."""
+    file_id = await image_cache.get(cache_key)
+    if file_id is None:
+        return None
+    try:
+        await bot.send_photo(chat_id=chat_id, photo=file_id)
+        logger.info("Image found in cache")
+        return file_id
+    except BadRequest as e:
+        logger.warning(f"Cached image is not available: {e}")
+        return None
+
+
+async def send_photo(bot: Bot, chat_id: int, image: Any, cache_key: str) -> str:
+    """Upload image and remember its file_id for repeated prompts."""
+    message = await bot.send_photo(chat_id=chat_id, photo=image)
+    file_id = message.photo[-1].file_id
+    await image_cache.set(cache_key, file_id)
+    return file_id
+
+
 def check_auth(func):
     """Check if user authorized"""
 
@@ -77,7 +272,18 @@ def check_auth(func):
         update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs
     ):
         user_id = context.user_data.get("user_id") or kwargs.get("user_id")
-        value = redis_client.get_value(user_id)
+        try:
+            with AUTH_SECONDS.time():
+                value = await get_auth(user_id)
+        except Exception as e:
+            logger.error(f"Authorization of user {user_id} failed: {e}")
+            AUTH_CHECKS.labels(result="error").inc()
+            await context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text="Sorry, service is temporarily unavailable",
+            )
+            return
+        AUTH_CHECKS.labels(result="authorized" if value else "denied").inc()
         # user_data = json.loads(value) if value else None
         if not value:
             logger.info(f"User {user_id} not authorized")
@@ -121,180 +327,253 @@ def check_auth(func):
 #         )
 
 
-@check_auth
-async def call_api_ydx_gpt(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: str, text: str
+async def report_error(
+    bot: Bot, chat_id: int, provider: Provider, e: Exception
 ) -> None:
-    """
-    Makes a request to the Yandex API to generate a response.
-    """
-    try:
-        system = {
-            "role": "system",
-            "text": "Ты - персональный ассистент. Ответь на следующий вопрос максимально содержательно в пяти предложениях",
-        }
-        messages = redis_client.get_value(f"{user_id}-ydx-context") or [system]
-        messages.append({"role": "user", "text": text})
-        response = ydx_gpt.run(messages).alternatives[0].text
-        messages.append({"role": "assistant", "text": response})
-        redis_client.set_value(f"{user_id}-ydx-context", messages)
-        logger.info("Response received")
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
-    except Exception as e:
-        logger.error(e)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
+    """Log failed backend request and let the user know."""
+    text = "Sorry, something went wrong"
+    if isinstance(e, CircuitOpenError):
+        logger.error(f"{provider.name}: {e}")
+        if provider.kind == "image":
+            text = "Sorry, image service unavailable"
+        else:
+            text = "Sorry, service is temporarily unavailable"
+    elif isinstance(e, (httpx.TimeoutException, TimeoutError)):
+        if isinstance(e, httpx.TimeoutException):
+            logger.error(f"HTTP TimeoutException for {e.request.url} - {e}")
+        else:
+            logger.error(f"{provider.name}: {e}")
+        if provider.kind == "image":
+            text = "Sorry, image service unavailable"
+        else:
+            text = "Sorry, timeout error"
+    elif isinstance(e, httpx.HTTPError):
+        logger.error(f"HTTP Exception for {e.request.url} - {e}")
+    else:
+        logger.error(f"{provider.name}: {e}")
+    # The update's budget may be spent already, the user should still know
+    with deadline.budget(None):
+        await bot.send_message(chat_id=chat_id, text=text)
 
 
-@check_auth
-async def call_api_claude(
+async def answer_text(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
     user_id: str,
     text: str,
     command: str,
+    provider: Provider,
 ) -> None:
     """
-    Makes a request to the Claude API to generate a response based on a given message.
+    Generate text response, with history for conversation commands and
+    cached for stateless ones. Cached responses are shared between chats,
+    so they are sent whole instead of streamed.
     """
-    try:
-        messages = []
-        if command == Config.SUMMARIZE:
-            system = "You should summarize next sentence:"
-        elif command == Config.TRANSLATE:
-            system = "Translate to english:"
-        elif command == Config.CLAUDE_LLM:
-            messages = redis_client.get_value(f"{user_id}-claude-context") or []
-            system = "You are best personal assistant. Respond only with short answer no more than five sentences."
-        messages.append({"role": "user", "content": text})
-        response = claude_prompt(system=system, messages=messages).content[0].text
-        if command == Config.CLAUDE_LLM:
-            messages.append({"role": "assistant", "content": response})
-            redis_client.set_value(f"{user_id}-claude-context", messages)
-        logger.info("Response received")
-        await context.bot.send_message(chat_id=update.effective_chat.id, text=response)
-    except Exception as e:
-        logger.error(e)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
+    chat_id = update.effective_chat.id
+    system = Config.SYSTEM_PROMPTS.get(command, "")
+    history = None
+    if command in Config.CONVERSATION_COMMANDS:
+        history = histories.get(provider.name)
+    request = {"role": "user", "content": text}
+    messages = [request]
+    if history:
+        async with deadline.timeout(Config.HISTORY_TIMEOUT, "history"):
+            messages = [*await history.load(user_id), request]
+
+    if command in Config.CACHED_COMMANDS:
+        cache_key = text_cache.make_key(
+            provider.name,
+            json.dumps(provider.cache_params(), sort_keys=True),
+            system,
+            text.strip(),
         )
-
-
-@check_auth
-async def call_api_local_llm(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: str, text: str
-) -> None:
-    """
-    Makes a request to the Ollama API to generate a response based on a given
-    message using Gemma model.
-    """
-    payload = Config.OLLAMA_PAYLOAD.copy()
-    payload["prompt"] = text
-    try:
-        async with httpx.AsyncClient() as client:
-            logger.info(f"Request to {Config.LLM_SERVER_URL}")
-            response = await client.post(
-                url=f"{Config.LLM_SERVER_URL}/api/generate",
-                json=payload,
-            )
-            response.raise_for_status()
-            logger.info("Response received")
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id, text=response.json()["response"]
+        response = await text_cache.get(cache_key)
+        if response is None:
+            # Only the backend call is shared, every caller answers its own chat
+            response, shared = await single_flight.do(
+                cache_key, partial(provider.generate_text, system, messages)
             )
-    except httpx.TimeoutException as e:
-        logger.error(f"HTTP TimeoutException for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, timeout error"
+            if not shared and response.strip():
+                await text_cache.set(cache_key, response)
+        else:
+            logger.info("Response found in cache")
+        await context.bot.send_message(chat_id=chat_id, text=response)
+    elif Config.STREAMING:
+        response = await stream_text(
+            context.bot, chat_id, provider.stream_text(system, messages)
         )
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP Exception for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
-    except Exception as e:
-        logger.error(e)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
+    else:
+        response = await provider.generate_text(system, messages)
+        await context.bot.send_message(chat_id=chat_id, text=response)
+    if not response.strip():
+        # Nothing was shown, keep it out of the conversation
+        logger.warning(f"Empty response from {provider.name}")
+    elif history:
+        await history.append(
+            user_id, request, {"role": "assistant", "content": response}
         )
 
 
-@check_auth
-async def call_api_sd(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: str, text: str
+async def answer_image(bot: Bot, chat_id: int, text: str, provider: Provider) -> str:
+    """
+    Generate image and send it, repeated prompts reuse the uploaded file_id.
+    """
+    cache_key = image_cache.make_key(
+        provider.name,
+        json.dumps(provider.cache_params(), sort_keys=True),
+        # A file_id uploaded with other encoding settings is not reused
+        json.dumps(encoding_params(), sort_keys=True),
+        text.strip(),
+    )
+
+    async def generate() -> bytes:
+        return await compress_image(await provider.generate_image(text))
+
+    file_id = await send_cached_photo(bot, chat_id, cache_key)
+    if file_id is not None:
+        return file_id
+    # Only generation is shared, every caller uploads to its own chat
+    image, _ = await single_flight.do(cache_key, generate)
+    # Bytes are uploaded as they are, a file object would be read into a copy
+    return await send_photo(bot, chat_id, image, cache_key)
+
+
+async def submit_image(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    user_id: str,
+    text: str,
+    command: str,
+    provider: Provider,
 ) -> None:
     """
-    Makes a POST request to an image generation API with a given description
-    as the payload.
-    Processes the response to obtain the generated image.
+    Queue image generation as a background job and acknowledge it at once.
+    """
+    chat_id = update.effective_chat.id
+    job_id = await image_jobs.submit(
+        user_id,
+        chat_id=chat_id,
+        command=command,
+        backend=provider.name,
+        prompt=text,
+    )
+    await context.bot.send_message(
+        chat_id=chat_id,
+        text=f"Generating your image, I will send it when ready. Check with /job {job_id}",
+    )
+
+
+async def process_image_job(bot: Bot, job: dict) -> dict:
     """
-    payload = Config.SD_PAYLOAD.copy()
-    payload["prompt"] = text
-    # user_info = redis_client.get_value(user_id)
+    Generate image of a queued job and deliver it to the chat.
+    """
+    provider = providers.get(job["backend"])
+    chat_id = int(job["chat_id"])
+    user_id = job["user_id"]
     try:
-        async with httpx.AsyncClient() as client:
-            logger.info(f"Request for status {Config.SD_SERVER_URL}")
-            response = await client.get(
-                url=f"{Config.SD_SERVER_URL}/sdapi/v1/progress",
-                # auth=(user_info["login"], user_info["pwd"]),
-            )
-            response.raise_for_status()
-            logger.info(f"Request for image to {Config.SD_SERVER_URL}")
-            response = await client.post(
-                url=f"{Config.SD_SERVER_URL}/sdapi/v1/txt2img",
-                # auth=(user_info["login"], user_info["pwd"]),
-                json=payload,
-            )
-            response.raise_for_status()
-            image = io.BytesIO(base64.b64decode(response.json()["images"][0]))
-            logger.info("Image received")
-            await context.bot.send_photo(chat_id=update.effective_chat.id, photo=image)
-    except httpx.TimeoutException as e:
-        logger.error(f"HTTP TimeoutException for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, image service unavailable"
-        )
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP Exception for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
+        with deadline.budget(Config.REQUEST_DEADLINE):
+            weight = await get_weight(user_id)
+            # Jobs of all users wait for the backend in fair order, the
+            # user's rate was checked on submission
+            async with (
+                deadline.timeout(None, "image job"),
+                admission.admit(
+                    user_id,
+                    provider.name,
+                    kind="image",
+                    weight=weight,
+                    limit_rate=False,
+                ) as wait,
+            ):
+                QUEUE_WAIT_SECONDS.labels(backend=provider.name, kind="image").observe(
+                    wait
+                )
+                file_id = await answer_image(bot, chat_id, job["prompt"], provider)
     except Exception as e:
-        logger.error(e)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
+        await report_error(bot, chat_id, provider, e)
+        raise
+    return {"file_id": file_id}
+
+
+def describe_job(job: dict) -> str:
+    """One line summary of job state for the user."""
+    text = f"Job {job['id']}: {job['status']}"
+    if job["status"] == "queued":
+        text += f", position {job['position']} in queue"
+    elif job["status"] == "failed":
+        text += f", {job.get('error', 'unknown error')}"
+    return text
+
+
+async def job_status(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Show status of the given image job, or of the user's recent jobs."""
+    user_id = str(update.effective_user.id)
+    if context.args:
+        job = await image_jobs.get(context.args[0])
+        jobs = [job] if job and job["user_id"] == user_id else []
+    else:
+        jobs = await image_jobs.user_jobs(user_id)
+    text = "\n".join(map(describe_job, jobs)) if jobs else "No jobs found"
+    await update.message.reply_text(text)
 
 
 @check_auth
-async def call_api_ydx_art(
-    update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: str, text: str
+async def call_api(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    user_id: str,
+    text: str,
+    command: str,
+    backend: Optional[str] = None,
+    on_queued: Optional[Callable[[int], Awaitable]] = None,
 ) -> None:
     """
-    Makes a request to the Yandex API to generate image.
+    Run command with the provider of its backend once the authorized request
+    is admitted, and send the result to the chat. Backend defaults to the one
+    configured for command. RateLimitError is left to the caller.
     """
+    provider = providers.get(backend) if backend else providers.for_command(command)
+    labels = {
+        "command": Config.COMMAND_NAMES.get(command, command),
+        "backend": provider.name,
+    }
+    REQUESTS.labels(**labels).inc()
     try:
-        logger.info("Request for yandex api")
-        response = ydx_art.run_deferred(text).wait()
-        image = io.BytesIO(response.image_bytes)
-        logger.info("Image received")
-        await context.bot.send_photo(chat_id=update.effective_chat.id, photo=image)
-    except httpx.TimeoutException as e:
-        logger.error(f"HTTP TimeoutException for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, image service unavailable"
-        )
-    except httpx.HTTPError as e:
-        logger.error(f"HTTP Exception for {e.request.url} - {e}")
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
+        with (
+            REQUESTS_IN_FLIGHT.track_inprogress(),
+            REQUEST_SECONDS.labels(**labels).time(),
+        ):
+            async with admit_request(user_id, provider.name, on_queued):
+                logger.info(f"Proceed request with {provider.name}")
+                if provider.kind == "image" and Config.IMAGE_JOBS:
+                    await submit_image(
+                        update,
+                        context,
+                        user_id=user_id,
+                        text=text,
+                        command=command,
+                        provider=provider,
+                    )
+                elif provider.kind == "image":
+                    await answer_image(
+                        context.bot,
+                        update.effective_chat.id,
+                        text=text,
+                        provider=provider,
+                    )
+                else:
+                    await answer_text(
+                        update,
+                        context,
+                        user_id=user_id,
+                        text=text,
+                        command=command,
+                        provider=provider,
+                    )
+    except RateLimitError:
+        raise
     except Exception as e:
-        logger.error(e)
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id, text="Sorry, something went wrong"
-        )
+        await report_error(context.bot, update.effective_chat.id, provider, e)
 
 
 # async def login(update: Update, context: ContextTypes.DEFAULT_TYPE):
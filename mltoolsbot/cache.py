@@ -0,0 +1,157 @@
+import hashlib
+import time
+
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+from loguru import logger
+from mltoolsbot.config import Config
+from mltoolsbot.redis import AsyncRedisClient
+
+
+class TTLCache:
+    """
+    In-process LRU cache with per-entry expiration and hit/miss counters.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key)
+        return item is not None and item[0] > time.monotonic()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return cached value and mark it as recently used
+        """
+        item = self._data.get(key)
+        if item is None or item[0] <= time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store value, evicting the least recently used entry when full
+        """
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class ResponseCache:
+    """
+    Two-tier cache of deterministic backend responses.
+
+    Entries are content addressed by a hash of the request parts. Lookups go
+    to a small in-process LRU first and then to Redis, where entries expire
+    after ttl and the oldest are evicted once max_entries is exceeded.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        name: str,
+        ttl: int = Config.RESPONSE_CACHE_TTL,
+        max_entries: int = Config.RESPONSE_CACHE_MAX_ENTRIES,
+        local_size: int = Config.RESPONSE_CACHE_LOCAL_SIZE,
+    ):
+        self.redis_client = redis_client
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = TTLCache(maxsize=local_size, ttl=ttl)
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.name}-cache:{key}"
+
+    @property
+    def _index_key(self) -> str:
+        return f"{self.name}-cache-index"
+
+    async def get(self, key: str) -> Any:
+        """
+        Return cached value or None
+        """
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = await self.redis_client.get_value(self._redis_key(key))
+        if value is None:
+            self.misses += 1
+            return None
+        self.redis_hits += 1
+        self.local.set(key, value["value"])
+        return value["value"]
+
+    async def set(self, key: str, value: Any) -> None:
+        """
+        Store value in both tiers, evicting the oldest Redis entries if full
+        """
+        self.local.set(key, value)
+        # Wrapped so that strings looking like JSON are not decoded on read
+        if not await self.redis_client.set_value(
+            self._redis_key(key), {"value": value}, expire_seconds=self.ttl
+        ):
+            return
+        try:
+            client = self.redis_client.redis_client
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.zadd(self._index_key, {key: time.time()})
+                pipe.zremrangebyscore(self._index_key, 0, time.time() - self.ttl)
+                pipe.zcard(self._index_key)
+                *_, size = await pipe.execute()
+            if size > self.max_entries:
+                evicted = await client.zpopmin(self._index_key, size - self.max_entries)
+                await client.delete(*(self._redis_key(k) for k, _ in evicted))
+        except Exception as e:
+            logger.error(f"Error updating {self.name} cache index: {e}")
+
+    def stats(self) -> dict:
+        local = self.local.stats()
+        total = local["hits"] + self.redis_hits + self.misses
+        return {
+            "local_hits": local["hits"],
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (local["hits"] + self.redis_hits) / total if total else 0.0,
+        }
@@ -0,0 +1,74 @@
+import importlib.util
+import httpx
+
+from typing import Optional
+from loguru import logger
+from telegram.request import HTTPXRequest
+from mltoolsbot import deadline
+from mltoolsbot.config import Config
+from mltoolsbot.metrics import TELEGRAM_SECONDS
+
+
+class HttpClients:
+    """
+    Long-lived httpx clients for the self-hosted backends (Ollama and
+    Stable Diffusion). Clients are created once on application startup and
+    keep their connection pools between requests.
+    """
+
+    ollama: Optional[httpx.AsyncClient] = None
+    sd: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def _build(base_url: Optional[str], read_timeout: float) -> httpx.AsyncClient:
+        http2 = Config.HTTP2 and importlib.util.find_spec("h2") is not None
+        if Config.HTTP2 and not http2:
+            logger.info("HTTP/2 requested but h2 is not installed, using HTTP/1.1")
+        return httpx.AsyncClient(
+            base_url=base_url or "",
+            http2=http2,
+            timeout=httpx.Timeout(
+                Config.HTTP_TIMEOUT,
+                connect=Config.HTTP_CONNECT_TIMEOUT,
+                read=read_timeout,
+            ),
+            limits=httpx.Limits(
+                max_connections=Config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+
+    async def start(self) -> None:
+        """
+        Create backend clients
+        """
+        logger.info("Init http clients")
+        if self.ollama is None:
+            self.ollama = self._build(Config.LLM_SERVER_URL, Config.LLM_READ_TIMEOUT)
+        if self.sd is None:
+            self.sd = self._build(Config.SD_SERVER_URL, Config.SD_READ_TIMEOUT)
+
+    async def close(self) -> None:
+        """
+        Close backend clients and release pooled connections
+        """
+        logger.info("Close http clients")
+        for name in ("ollama", "sd"):
+            client = getattr(self, name)
+            if client is not None:
+                await client.aclose()
+                setattr(self, name, None)
+
+
+class BotRequest(HTTPXRequest):
+    """
+    Bot API request backend recording the duration of every API call and
+    cancelling calls that outlive the deadline of the update being handled.
+    """
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        with TELEGRAM_SECONDS.labels(method=api_method).time():
+            async with deadline.timeout(None, api_method):
+                return await super().do_request(url, method, *args, **kwargs)
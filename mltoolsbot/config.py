@@ -1,4 +1,5 @@
 import os
+import socket
 from dotenv import load_dotenv
 from telegram.ext import ConversationHandler
 from mltoolsbot.exceptions import ConfigError
@@ -8,16 +9,128 @@ load_dotenv()
 
 
 class Config:
-    logger.info("Init config")
     BOT_TOKEN = os.getenv("BOT_TOKEN")
+    # "polling", "webhook", or "ingress", "worker" and "jobs" for scale-out
+    BOT_MODE = os.getenv("BOT_MODE", "polling")
+    WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+    WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+    WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8443))
+    WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram")
+    WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+    WORKERS = int(os.getenv("WORKERS", 1))
+    WORKER_ID = int(os.getenv("WORKER_ID", 0))
+    STREAM_PREFIX = os.getenv("STREAM_PREFIX", "updates")
+    STREAM_PARTITIONS = int(os.getenv("STREAM_PARTITIONS", 16))
+    STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", 10000))
+    STREAM_BATCH = int(os.getenv("STREAM_BATCH", 32))
+    STREAM_BLOCK_MS = int(os.getenv("STREAM_BLOCK_MS", 5000))
     ANTHROPIC_TOKEN = os.getenv("ANTHROPIC_TOKEN")
     TTS_TOKEN = os.getenv("ELEVENLABS_TOKEN")
     YDX_FOLDER_ID = os.getenv("YDX_FOLDER_ID")
     YDX_API_KEY = os.getenv("YDX_API_KEY")
     REDIS_HOST = os.getenv("REDIS_HOST", "redis")
     REDIS_PORT = os.getenv("REDIS_PORT", 6379)
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 20))
+    REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+    AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 300))
+    AUTH_CACHE_NEGATIVE_TTL = float(os.getenv("AUTH_CACHE_NEGATIVE_TTL", 30))
+    # Publish a user id (or "*" for everyone) here to drop cached auth records
+    AUTH_INVALIDATE_CHANNEL = os.getenv("AUTH_INVALIDATE_CHANNEL", "auth-invalidate")
+    HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", 10))
+    HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", 2000))
+    HISTORY_TTL = int(os.getenv("HISTORY_TTL", 24 * 60 * 60))
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 7 * 24 * 60 * 60))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+    RESPONSE_CACHE_LOCAL_SIZE = int(os.getenv("RESPONSE_CACHE_LOCAL_SIZE", 256))
+    IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", 30 * 24 * 60 * 60))
+    IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", 10000))
+    STREAMING = os.getenv("STREAMING", "true").lower() == "true"
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.0))
+    PERSISTENCE_PREFIX = os.getenv("PERSISTENCE_PREFIX", "ptb")
+    PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", 10))
+    # Updates processed in parallel, updates of one chat always stay sequential
+    CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 32))
+    USER_RATE_LIMIT = float(os.getenv("USER_RATE_LIMIT", 5))
+    USER_RATE_PERIOD = float(os.getenv("USER_RATE_PERIOD", 60))
+    GLOBAL_CONCURRENCY = int(os.getenv("GLOBAL_CONCURRENCY", 32))
+    # Share of backend slots a request uses up in fair queuing, by kind;
+    # users' auth records may carry a "weight" multiplying their share
+    KIND_COSTS = {
+        "text": float(os.getenv("TEXT_COST", 1)),
+        "image": float(os.getenv("IMAGE_COST", 10)),
+    }
+    # Prometheus metrics are served on http://METRICS_HOST:METRICS_PORT/metrics, 0 disables
+    METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", 8000))
     SD_SERVER_URL = os.getenv("SD_SERVER_URL")
     LLM_SERVER_URL = os.getenv("LLM_SERVER_URL")
+    HTTP2 = os.getenv("HTTP2", "true").lower() == "true"
+    HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))
+    HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 20))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+        os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 10)
+    )
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))
+    LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+    SD_READ_TIMEOUT = float(os.getenv("SD_READ_TIMEOUT", 300))
+    # Re-encode generated images as "jpeg" or "webp" before upload, needs
+    # Pillow; IMAGE_MAX_SIZE limits the longest side in pixels, 0 keeps it
+    IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "").lower()
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", 85))
+    IMAGE_MAX_SIZE = int(os.getenv("IMAGE_MAX_SIZE", 0))
+    IMAGE_PROCESSES = int(os.getenv("IMAGE_PROCESSES", 2))
+    YDX_ART_TIMEOUT = float(os.getenv("YDX_ART_TIMEOUT", 120))
+    YDX_ART_POLL_INTERVAL = float(os.getenv("YDX_ART_POLL_INTERVAL", 2))
+    # Time budget of a whole update, shared by queueing, auth, history,
+    # backend call and Telegram sends
+    REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", 600))
+    RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", 0.5))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", 5))
+    # Consecutive failures after which a backend is not called for a while
+    BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", 5))
+    BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+    HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", 15))
+    HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", 5))
+    AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT", 5))
+    HISTORY_TIMEOUT = float(os.getenv("HISTORY_TIMEOUT", 5))
+    # Generate images in background jobs, the photo is sent when ready
+    IMAGE_JOBS = os.getenv("IMAGE_JOBS", "true").lower() == "true"
+    # Jobs taken concurrently by this process, 0 leaves them to BOT_MODE=jobs.
+    # They wait for backend slots in fair order, so this should be well above
+    # the image backends' concurrency
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", 16))
+    JOB_PREFIX = os.getenv("JOB_PREFIX", "jobs")
+    # Stable per process, so unfinished jobs are resumed after a restart
+    JOB_CONSUMER = os.getenv("JOB_CONSUMER", socket.gethostname())
+    JOB_TTL = int(os.getenv("JOB_TTL", 24 * 60 * 60))
+    # Jobs of a dead worker are taken over after this many seconds
+    JOB_CLAIM_IDLE = float(os.getenv("JOB_CLAIM_IDLE", REQUEST_DEADLINE + 60))
+
+    # Backends
+    CLAUDE = "claude"
+    YDX_GPT = "yandexgpt"
+    YDX_ART = "yandexart"
+    OLLAMA = "ollama"
+    SD = "sd"
+    BACKEND_CONCURRENCY = {
+        CLAUDE: int(os.getenv("CLAUDE_CONCURRENCY", 8)),
+        YDX_GPT: int(os.getenv("YDX_GPT_CONCURRENCY", 8)),
+        YDX_ART: int(os.getenv("YDX_ART_CONCURRENCY", 2)),
+        OLLAMA: int(os.getenv("OLLAMA_CONCURRENCY", 2)),
+        SD: int(os.getenv("SD_CONCURRENCY", 1)),
+    }
+    BACKEND_TIMEOUTS = {
+        CLAUDE: float(os.getenv("CLAUDE_TIMEOUT", 60)),
+        YDX_GPT: float(os.getenv("YDX_GPT_TIMEOUT", 60)),
+        YDX_ART: float(os.getenv("YDX_ART_DEADLINE", YDX_ART_TIMEOUT + 30)),
+        OLLAMA: float(os.getenv("OLLAMA_TIMEOUT", LLM_READ_TIMEOUT)),
+        SD: float(os.getenv("SD_TIMEOUT", SD_READ_TIMEOUT)),
+    }
 
     TEXT2TEXT_LOCAL = "text2text_local"
     TEXT2TEXT_API = "text2text_api"
@@ -30,6 +143,32 @@ class Config:
     # State definitions for text2text level conversation
     SELECTING_PROMPT, SUMMARIZE, TRANSLATE, CLAUDE_LLM, YDX_LLM = map(chr, range(3, 8))
     SUBCOMMANDS = [TEXT2TEXT, SUMMARIZE, TRANSLATE, CLAUDE_LLM, YDX_LLM, TEXT2IMG]
+    COMMAND_BACKENDS = {
+        SUMMARIZE: CLAUDE,
+        TRANSLATE: CLAUDE,
+        CLAUDE_LLM: CLAUDE,
+        YDX_LLM: YDX_GPT,
+        TEXT2IMG: YDX_ART,
+    }
+    # Readable command names for logs and metrics
+    COMMAND_NAMES = {
+        SUMMARIZE: "summarize",
+        TRANSLATE: "translate",
+        CLAUDE_LLM: "claude",
+        YDX_LLM: "yandex",
+        TEXT2IMG: "text2img",
+    }
+    # Commands continuing a conversation, they are sent with the chat history
+    CONVERSATION_COMMANDS = [CLAUDE_LLM, YDX_LLM]
+    # Stateless commands, their responses are cached
+    CACHED_COMMANDS = [SUMMARIZE, TRANSLATE]
+    SYSTEM_PROMPTS = {
+        SUMMARIZE: "You should summarize next sentence:",
+        TRANSLATE: "Translate to english:",
+        CLAUDE_LLM: "You are best personal assistant. Respond only with short answer no more than five sentences.",
+        YDX_LLM: "Ты - персональный ассистент. Ответь на следующий вопрос максимально содержательно в пяти предложениях",
+        TEXT2TEXT_API: "You are best personal assistant. Respond only with short answer no more than five sentences.",
+    }
     # Meta states
     TYPING, STOPPING, START_OVER = map(chr, range(8, 11))
     END = ConversationHandler.END
@@ -51,10 +190,15 @@ class Config:
         },
     }
 
+    YDX_ART_CONFIG = {
+        "width_ratio": 2,
+        "height_ratio": 1,
+    }
+
     OLLAMA_PAYLOAD = {
         "model": "llama3.2",
         "keep_alive": "10m",
-        "stream": False,
+        "stream": STREAMING,
     }
 
     CLAUDE_PAYLOAD = {
@@ -75,10 +219,22 @@ class Config:
         claude - general conversation with claude-3.5-sonnet model
         yandex - general conversation with yandex-gpt model
     text2img - create image according to your description using yandex-art
+    /job [id] - show status of your image jobs
     """
 
     @classmethod
     def validate(cls):
         """Validate configuration settings."""
+        logger.info("Validate config")
         if not cls.BOT_TOKEN:
             raise ConfigError("Bot token not configured")
+        if cls.BOT_MODE not in ("polling", "webhook", "ingress", "worker", "jobs"):
+            raise ConfigError(f"Unknown bot mode: {cls.BOT_MODE}")
+        if cls.BOT_MODE in ("webhook", "ingress") and not cls.WEBHOOK_URL:
+            raise ConfigError("Webhook url not configured")
+        if cls.BOT_MODE == "jobs" and not (cls.IMAGE_JOBS and cls.JOB_WORKERS):
+            raise ConfigError("Jobs mode needs image jobs and job workers enabled")
+        if cls.IMAGE_FORMAT not in ("", "jpeg", "webp"):
+            raise ConfigError(f"Unknown image format: {cls.IMAGE_FORMAT}")
+        if not 0 <= cls.WORKER_ID < cls.WORKERS <= cls.STREAM_PARTITIONS:
+            raise ConfigError("Worker id must be below workers and partitions")
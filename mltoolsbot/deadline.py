@@ -0,0 +1,70 @@
+import asyncio
+
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+from mltoolsbot.exceptions import TimeoutError
+
+# Event loop time by which the current update must be handled
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left of the current update's budget, None if there is no budget
+    """
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - asyncio.get_running_loop().time()
+
+
+def expired() -> bool:
+    """
+    Whether the current update's budget is spent
+    """
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def expires(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Loop time after timeout seconds, but no later than the update's deadline
+    """
+    deadline = _deadline.get()
+    if timeout is not None:
+        end = asyncio.get_running_loop().time() + timeout
+        deadline = end if deadline is None else min(deadline, end)
+    return deadline
+
+
+@contextmanager
+def budget(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the block (and everything it awaits) seconds to finish, a budget
+    already in effect is only shortened. None removes the budget.
+    """
+    token = _deadline.set(expires(seconds) if seconds is not None else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@asynccontextmanager
+async def timeout_at(when: Optional[float], name: str) -> AsyncIterator[None]:
+    """
+    Cancel the block at loop time when, raising TimeoutError
+    """
+    if when is not None and when <= asyncio.get_running_loop().time():
+        raise TimeoutError(f"Deadline exceeded before {name}")
+    try:
+        async with asyncio.timeout_at(when):
+            yield
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Operation timed out: {name}")
+
+
+def timeout(seconds: Optional[float], name: str):
+    """
+    Cancel the block after seconds or at the update's deadline, if earlier
+    """
+    return timeout_at(expires(seconds), name)
@@ -26,6 +26,18 @@ class HandlerError(BotError):
     pass
 
 
+class RateLimitError(BotError):
+    """Raised when a user exceeds the request rate limit."""
+
+    pass
+
+
+class CircuitOpenError(BotError):
+    """Raised when calls to a failing backend are rejected."""
+
+    pass
+
+
 class TimeoutError(BotError):
     """Raised when an operation times out."""
 
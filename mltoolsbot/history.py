@@ -0,0 +1,67 @@
+from loguru import logger
+from mltoolsbot.config import Config
+from mltoolsbot.redis import AsyncRedisClient
+
+
+def estimate_tokens(message: dict) -> int:
+    """Rough token count of a message, about four characters per token."""
+    text = message.get("content") or message.get("text") or ""
+    return len(text) // 4 + 1
+
+
+class ConversationHistory:
+    """
+    Bounded per-user conversation history stored as a Redis list.
+
+    Each turn is appended with RPUSH and the list is trimmed to the last
+    max_turns turns with LTRIM, so saving is O(1) regardless of conversation
+    length. On load the oldest turns are additionally dropped until the
+    history fits into max_tokens.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        name: str,
+        max_turns: int = Config.HISTORY_MAX_TURNS,
+        max_tokens: int = Config.HISTORY_MAX_TOKENS,
+        ttl: int = Config.HISTORY_TTL,
+    ):
+        self.redis_client = redis_client
+        self.name = name
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.ttl = ttl
+
+    def key(self, user_id: str) -> str:
+        return f"{user_id}-{self.name}-history"
+
+    async def load(self, user_id: str) -> list[dict]:
+        """
+        Return last messages of the conversation fitting into the token window
+        """
+        messages = await self.redis_client.get_list(
+            self.key(user_id), -2 * self.max_turns, -1
+        )
+        tokens = sum(estimate_tokens(m) for m in messages)
+        # Drop whole turns so history always starts with a user message
+        while messages and tokens > self.max_tokens:
+            for message in messages[:2]:
+                tokens -= estimate_tokens(message)
+            messages = messages[2:]
+        logger.info(f"Loaded {len(messages)} messages of {self.name} history")
+        return messages
+
+    async def append(self, user_id: str, request: dict, response: dict) -> bool:
+        """
+        Save one turn (user request and assistant response)
+        """
+        return await self.redis_client.push_values(
+            self.key(user_id),
+            [request, response],
+            max_len=2 * self.max_turns,
+            expire_seconds=self.ttl,
+        )
+
+    async def clear(self, user_id: str) -> bool:
+        return await self.redis_client.delete_value(self.key(user_id))
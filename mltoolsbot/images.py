@@ -0,0 +1,156 @@
+import asyncio
+import binascii
+import io
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache
+from importlib.util import find_spec
+from multiprocessing import get_context
+from typing import Optional
+from loguru import logger
+from mltoolsbot.config import Config
+
+IMAGES_KEY = b'"images"'
+
+
+class ImageDecoder:
+    """
+    Decode the base64 "images" of a txt2img JSON response as it arrives.
+
+    Chunks are scanned for the images array and its strings are decoded
+    piece by piece into a growing buffer, so neither the whole response
+    body nor the base64 text of an image is held in memory, and the
+    decoded bytes are handed on without another copy.
+    """
+
+    def __init__(self):
+        self.images: list[bytes] = []
+        self._state = "seek"
+        # Unparsed bytes while looking for the images array
+        self._head = bytearray()
+        self._image: Optional[io.BytesIO] = None
+        # Base64 characters short of a whole 4 character group
+        self._rest = b""
+
+    def feed(self, chunk: bytes) -> None:
+        pos = 0
+        while pos < len(chunk) and self._state != "done":
+            if self._state == "seek":
+                self._head += chunk[pos:]
+                chunk, pos = b"", 0
+                index = self._head.find(IMAGES_KEY)
+                if index < 0:
+                    del self._head[: -len(IMAGES_KEY)]
+                    return
+                bracket = self._head.find(b"[", index)
+                if bracket < 0:
+                    del self._head[:index]
+                    return
+                chunk = bytes(self._head[bracket + 1 :])
+                self._head.clear()
+                self._state = "array"
+            elif self._state == "array":
+                byte = chunk[pos : pos + 1]
+                pos += 1
+                if byte == b'"':
+                    self._image = io.BytesIO()
+                    self._state = "string"
+                elif byte == b"]":
+                    self._state = "done"
+            else:
+                end = chunk.find(b'"', pos)
+                stop = len(chunk) if end < 0 else end
+                self._decode(memoryview(chunk)[pos:stop])
+                if end < 0:
+                    return
+                self._finish_image()
+                self._state = "array"
+                pos = end + 1
+
+    def _decode(self, data: memoryview) -> None:
+        if self._rest:
+            data = memoryview(self._rest + data)
+        usable = len(data) - len(data) % 4
+        self._image.write(binascii.a2b_base64(data[:usable]))
+        self._rest = bytes(data[usable:])
+
+    def _finish_image(self) -> None:
+        if self._rest:
+            self._image.write(binascii.a2b_base64(self._rest))
+            self._rest = b""
+        # getvalue hands over the buffer without copying it
+        self.images.append(self._image.getvalue())
+        self._image = None
+
+
+def encode_image(image: bytes, format: str, quality: int, max_size: int) -> bytes:
+    """
+    Re-encode image as format ("jpeg" or "webp"), shrunk to fit max_size
+    pixels if it is larger and max_size is not 0
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image)) as picture:
+        if max_size:
+            picture.thumbnail((max_size, max_size))
+        if format == "jpeg" and picture.mode not in ("RGB", "L"):
+            picture = picture.convert("RGB")
+        output = io.BytesIO()
+        picture.save(output, format=format.upper(), quality=quality)
+    return output.getvalue()
+
+
+@cache
+def pillow_available() -> bool:
+    available = find_spec("PIL") is not None
+    if not available:
+        logger.warning("Pillow is not installed, images are uploaded as generated")
+    return available
+
+
+@cache
+def process_pool() -> ProcessPoolExecutor:
+    """
+    Encoding workers, spawned rather than forked from the running bot
+    """
+    logger.info(f"Start {Config.IMAGE_PROCESSES} image processes")
+    return ProcessPoolExecutor(Config.IMAGE_PROCESSES, mp_context=get_context("spawn"))
+
+
+def shutdown_pool() -> None:
+    if process_pool.cache_info().currsize:
+        process_pool().shutdown(cancel_futures=True)
+        process_pool.cache_clear()
+
+
+def encoding_params() -> dict:
+    """
+    Settings that together with the generated image determine the upload
+    """
+    return {
+        "format": Config.IMAGE_FORMAT,
+        "quality": Config.IMAGE_QUALITY,
+        "max_size": Config.IMAGE_MAX_SIZE,
+    }
+
+
+async def compress_image(image: bytes) -> bytes:
+    """
+    Re-encode image for upload in a worker process when IMAGE_FORMAT is set,
+    the original is returned if it is not smaller or encoding fails
+    """
+    if not Config.IMAGE_FORMAT or not pillow_available():
+        return image
+    try:
+        encoded = await asyncio.get_running_loop().run_in_executor(
+            process_pool(),
+            encode_image,
+            image,
+            Config.IMAGE_FORMAT,
+            Config.IMAGE_QUALITY,
+            Config.IMAGE_MAX_SIZE,
+        )
+    except Exception as e:
+        logger.error(f"Image encoding failed: {e}")
+        return image
+    return encoded if len(encoded) < len(image) else image
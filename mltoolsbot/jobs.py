@@ -0,0 +1,226 @@
+import asyncio
+import time
+import uuid
+
+from typing import Any, Awaitable, Callable, Optional
+from loguru import logger
+from redis.exceptions import ResponseError
+from mltoolsbot.config import Config
+from mltoolsbot.metrics import JOB_WAIT_SECONDS, JOBS
+from mltoolsbot.redis import AsyncRedisClient
+
+
+class JobQueue:
+    """
+    Background jobs kept in Redis.
+
+    A job is a hash with its request and status ("queued", "running", "done"
+    or "failed"). Job ids are appended to a stream consumed by a consumer
+    group, so any process with job workers can take them, and jobs of a
+    worker that died are claimed by others once they are idle long enough.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        name: str = Config.JOB_PREFIX,
+        group: str = "workers",
+        ttl: int = Config.JOB_TTL,
+    ):
+        self.redis_client = redis_client
+        self.name = name
+        self.group = group
+        self.ttl = ttl
+
+    @property
+    def stream(self) -> str:
+        return f"{self.name}:queue"
+
+    @property
+    def queued(self) -> str:
+        return f"{self.name}:queued"
+
+    def job_key(self, job_id: str) -> str:
+        return f"{self.name}:job:{job_id}"
+
+    def user_key(self, user_id: str) -> str:
+        return f"{self.name}:user:{user_id}"
+
+    async def submit(self, user_id: str, **fields: Any) -> str:
+        """
+        Store job and queue it, returns job id
+        """
+        job_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        job = {"id": job_id, "user_id": user_id, "status": "queued", "created": now}
+        async with self.redis_client.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.job_key(job_id), mapping={**job, **fields})
+            pipe.expire(self.job_key(job_id), self.ttl)
+            pipe.zadd(self.queued, {job_id: now})
+            pipe.rpush(self.user_key(user_id), job_id)
+            pipe.ltrim(self.user_key(user_id), -10, -1)
+            pipe.expire(self.user_key(user_id), self.ttl)
+            pipe.xadd(
+                self.stream,
+                {"id": job_id},
+                maxlen=Config.STREAM_MAXLEN,
+                approximate=True,
+            )
+            await pipe.execute()
+        JOBS.labels(status="queued").inc()
+        logger.info(f"Job {job_id} queued")
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """
+        Return job with its queue position while queued
+        """
+        client = self.redis_client.redis_client
+        job = await client.hgetall(self.job_key(job_id))
+        if not job:
+            return None
+        if job["status"] == "queued":
+            rank = await client.zrank(self.queued, job_id)
+            job["position"] = rank + 1 if rank is not None else 1
+        return job
+
+    async def user_jobs(self, user_id: str) -> list[dict]:
+        """
+        Return recent jobs of user, newest first
+        """
+        job_ids = await self.redis_client.redis_client.lrange(
+            self.user_key(user_id), 0, -1
+        )
+        jobs = [await self.get(job_id) for job_id in reversed(job_ids)]
+        return [job for job in jobs if job]
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        await self.redis_client.redis_client.hset(self.job_key(job_id), mapping=fields)
+
+    async def start(self, job_id: str) -> Optional[dict]:
+        """
+        Mark job as running, returns None if it expired meanwhile
+        """
+        client = self.redis_client.redis_client
+        job = await client.hgetall(self.job_key(job_id))
+        await client.zrem(self.queued, job_id)
+        if not job:
+            return None
+        now = time.time()
+        await self.update(job_id, status="running", started=now)
+        JOB_WAIT_SECONDS.observe(now - float(job["created"]))
+        return job
+
+    async def finish(self, job_id: str, status: str, **fields: Any) -> None:
+        await self.update(job_id, status=status, finished=time.time(), **fields)
+        JOBS.labels(status=status).inc()
+
+    async def create_group(self) -> None:
+        try:
+            await self.redis_client.redis_client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def read(
+        self, consumer: str, count: int, pending: bool = False, block: int = 0
+    ) -> list[tuple[str, str]]:
+        """
+        Read (entry id, job id) for consumer, either own unacknowledged or new
+        """
+        response = await self.redis_client.redis_client.xreadgroup(
+            self.group,
+            consumer,
+            {self.stream: "0" if pending else ">"},
+            count=count,
+            block=None if pending else block,
+        )
+        return [
+            (entry_id, fields["id"])
+            for _, entries in response or []
+            for entry_id, fields in entries
+            if fields
+        ]
+
+    async def claim(self, consumer: str, min_idle: float, count: int) -> list[tuple]:
+        """
+        Take over jobs other consumers did not acknowledge for min_idle seconds
+        """
+        _, entries, *_ = await self.redis_client.redis_client.xautoclaim(
+            self.stream, self.group, consumer, int(min_idle * 1000), count=count
+        )
+        return [(entry_id, fields["id"]) for entry_id, fields in entries if fields]
+
+    async def ack(self, entry_id: str) -> None:
+        await self.redis_client.redis_client.xack(self.stream, self.group, entry_id)
+
+
+async def run_job_workers(
+    queue: JobQueue,
+    handler: Callable[[dict], Awaitable[Optional[dict]]],
+    consumer: str = Config.JOB_CONSUMER,
+    concurrency: int = Config.JOB_WORKERS,
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Run up to concurrency jobs at once with handler until stop_event is set.
+    Handler results are stored in the job, exceptions mark it as failed.
+    """
+    logger.info(f"Job consumer {consumer} runs {concurrency} workers")
+    stop_event = stop_event or asyncio.Event()
+    in_flight: set[asyncio.Task] = set()
+    backlog: Optional[list[tuple[str, str]]] = None
+    claimed_at = 0.0
+
+    async def process(entry_id: str, job_id: str) -> None:
+        try:
+            job = await queue.start(job_id)
+            if job is not None:
+                try:
+                    result = await handler(job)
+                    await queue.finish(job_id, "done", **(result or {}))
+                except Exception as e:
+                    logger.error(f"Job {job_id} failed: {e}")
+                    await queue.finish(job_id, "failed", error=str(e))
+            await queue.ack(entry_id)
+        except Exception as e:
+            logger.error(f"Error processing job {job_id}: {e}")
+
+    try:
+        while not stop_event.is_set():
+            if len(in_flight) >= concurrency:
+                _, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                continue
+            free = concurrency - len(in_flight)
+            try:
+                if backlog is None:
+                    await queue.create_group()
+                    # Jobs started before a restart but never acknowledged
+                    # come first
+                    backlog = await queue.read(consumer, count=1000, pending=True)
+                if backlog:
+                    entries, backlog = backlog[:free], backlog[free:]
+                elif time.monotonic() - claimed_at > Config.JOB_CLAIM_IDLE / 2:
+                    claimed_at = time.monotonic()
+                    entries = await queue.claim(consumer, Config.JOB_CLAIM_IDLE, free)
+                else:
+                    entries = await queue.read(
+                        consumer, count=free, block=Config.STREAM_BLOCK_MS
+                    )
+            except Exception as e:
+                logger.error(f"Error reading jobs: {e}")
+                await asyncio.sleep(1)
+                continue
+            for entry_id, job_id in entries:
+                in_flight.add(asyncio.create_task(process(entry_id, job_id)))
+    except asyncio.CancelledError:
+        # Unacknowledged jobs are resumed after a restart
+        for task in in_flight:
+            task.cancel()
+        raise
+    finally:
+        await asyncio.gather(*in_flight, return_exceptions=True)
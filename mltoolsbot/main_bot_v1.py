@@ -13,15 +13,25 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
-from aiolimiter import AsyncLimiter
+from mltoolsbot import deadline
+from mltoolsbot.clients import BotRequest
 from mltoolsbot.config import Config
+from mltoolsbot.exceptions import RateLimitError
+from mltoolsbot.metrics import RATE_LIMITED
 from mltoolsbot.api import (
-    call_api_local_llm,
+    call_api,
     # call_api_11labs,
-    call_api_sd,
-    call_api_claude,
+    close_clients,
+    init_clients,
+    job_status,
 )
 
+COMMAND_BACKENDS = {
+    Config.TEXT2TEXT_LOCAL: Config.OLLAMA,
+    Config.TEXT2TEXT_API: Config.CLAUDE,
+    Config.TEXT2IMG: Config.SD,
+}
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
@@ -58,6 +68,34 @@ async def text2speech(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str
     return Config.TEXT2SPEECH_API
 
 
+async def run_command(
+    update: Update,
+    context: ContextTypes.DEFAULT_TYPE,
+    user_id: str,
+    text: str,
+    command: str,
+) -> None:
+    """Call the backend of command within the update's budget."""
+    backend = COMMAND_BACKENDS[command]
+    try:
+        with deadline.budget(Config.REQUEST_DEADLINE):
+            logger.info(f"Proceed {command}")
+            await call_api(
+                update,
+                context,
+                user_id=user_id,
+                text=text,
+                command=command,
+                backend=backend,
+            )
+    except RateLimitError:
+        RATE_LIMITED.labels(backend=backend).inc()
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text="Too many requests, try again later.",
+        )
+
+
 async def text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Handles text messages received by the bot.
@@ -71,21 +109,9 @@ async def text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     command = context.user_data.get("command")
     logger.info(f"Check command: {command}")
 
-    if command == Config.TEXT2TEXT_LOCAL:
-        logger.info("Proceed text2text local")
+    if command in COMMAND_BACKENDS:
         status_msg = await update.message.reply_text("Proceed request...")
-        async with AsyncLimiter(2):
-            await call_api_local_llm(update, context, user_id=user_id, text=text)
-    elif command == Config.TEXT2TEXT_API:
-        logger.info("Proceed text2text claude api")
-        status_msg = await update.message.reply_text("Proceed request...")
-        async with AsyncLimiter(2):
-            await call_api_claude(update, context, user_id=user_id, text=text)
-    elif command == Config.TEXT2IMG:
-        logger.info("Proceed text2img")
-        status_msg = await update.message.reply_text("Proceed request...")
-        async with AsyncLimiter(2):
-            await call_api_sd(update, context, user_id=user_id, text=text)
+        await run_command(update, context, user_id=user_id, text=text, command=command)
     # elif command == Config.TEXT2SPEECH_API:
     #     logger.info("Proceed text2speech")
     #     status_msg = await update.message.reply_text("Proceed request...")
@@ -133,14 +159,12 @@ async def buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     status_msg = await query.edit_message_text("Start working on it")
     logger.info(f"Button pressed: {query.data}")
 
-    if query.data == Config.TEXT2TEXT_LOCAL:
-        await call_api_local_llm(update, context, user_id=user_id, text=text)
-    elif query.data == Config.TEXT2TEXT_API:
-        await call_api_claude(update, context, user_id=user_id, text=text)
+    if query.data in COMMAND_BACKENDS:
+        await run_command(
+            update, context, user_id=user_id, text=text, command=query.data
+        )
     # elif query.data == Config.TEXT2SPEECH_API:
     #     await call_api_11labs(update, context, user_id=user_id, text=text)
-    elif query.data == Config.TEXT2IMG:
-        await call_api_sd(update, context, user_id=user_id, text=text)
 
     context.user_data["last_message"] = ""
     await context.bot.delete_message(
@@ -149,7 +173,15 @@ async def buttons(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 def create_application():
-    application = Application.builder().token(Config.BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(Config.BOT_TOKEN)
+        # Same pool size as the builder default
+        .request(BotRequest(connection_pool_size=256))
+        .post_init(init_clients)
+        .post_shutdown(close_clients)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help))
@@ -157,6 +189,7 @@ def create_application():
     application.add_handler(CommandHandler("claude", text2text_api))
     application.add_handler(CommandHandler("audio", text2speech))
     application.add_handler(CommandHandler("image", text2img))
+    application.add_handler(CommandHandler("job", job_status))
     application.add_handler(
         MessageHandler(filters.TEXT & ~filters.COMMAND, text_message)
     )
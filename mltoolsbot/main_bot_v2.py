@@ -1,3 +1,4 @@
+from functools import partial
 from telegram import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
@@ -12,10 +13,21 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
-from aiolimiter import AsyncLimiter
 from mltoolsbot.config import Config, ConfigError
-from mltoolsbot.api import call_api_claude, call_api_ydx_art, call_api_ydx_gpt
-from mltoolsbot.exceptions import error_handler
+from mltoolsbot.api import (
+    admission,
+    call_api,
+    close_clients,
+    init_clients,
+    job_status,
+    redis_client,
+)
+from mltoolsbot.exceptions import RateLimitError, error_handler
+from mltoolsbot import deadline
+from mltoolsbot.clients import BotRequest
+from mltoolsbot.metrics import QUEUE_WAITING, RATE_LIMITED
+from mltoolsbot.processor import ChatOrderedUpdateProcessor
+from mltoolsbot.persistence import RedisPersistence
 from loguru import logger
 from warnings import filterwarnings
 from telegram.warnings import PTBUserWarning
@@ -24,7 +36,13 @@ filterwarnings(
     action="ignore", message=r".*CallbackQueryHandler", category=PTBUserWarning
 )
 
-limiter = AsyncLimiter(2)
+for backend in admission.limits:
+    QUEUE_WAITING.labels(backend=backend).set_function(
+        partial(admission.waiting.get, backend)
+    )
+
+# Only update types handled by create_application
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
 
 # TODO: Add exception handling
 
@@ -132,28 +150,35 @@ async def proceed_command(
     user_id = str(update.message.from_user.id)
     command = context.user_data.get("command")
     context.user_data["command"] = ""
-    if command not in Config.SUBCOMMANDS:
+    if command not in Config.COMMAND_BACKENDS:
         status_msg = await update.message.reply_text("Sorry unknown request. 😔")
         return ConversationHandler.END
 
     status_msg = await update.message.reply_text("Proceed request... 👨‍💻")
+
+    async def on_queued(position: int) -> None:
+        await status_msg.edit_text(f"Request queued, position {position}... ⏳")
+
     next = ConversationHandler.END
-    if command in [Config.SUMMARIZE, Config.TRANSLATE, Config.CLAUDE_LLM]:
-        logger.info("Proceed text2text claude api")
-        await call_api_claude(
-            update, context, user_id=user_id, text=text, command=command
-        )
-        if command == Config.CLAUDE_LLM:
+    backend = Config.COMMAND_BACKENDS[command]
+    try:
+        with deadline.budget(Config.REQUEST_DEADLINE):
+            await call_api(
+                update,
+                context,
+                user_id=user_id,
+                text=text,
+                command=command,
+                on_queued=on_queued,
+            )
+        if command in Config.CONVERSATION_COMMANDS:
             next = Config.TYPING
-            context.user_data["command"] = Config.CLAUDE_LLM
-    elif command == Config.YDX_LLM:
-        logger.info("Proceed text2text yandex api")
-        await call_api_ydx_gpt(update, context, user_id=user_id, text=text)
+            context.user_data["command"] = command
+    except RateLimitError:
+        RATE_LIMITED.labels(backend=backend).inc()
+        await update.message.reply_text("Too many requests, try again later. 🐢")
         next = Config.TYPING
-        context.user_data["command"] = Config.YDX_LLM
-    elif command == Config.TEXT2IMG:
-        logger.info("Proceed text2img")
-        await call_api_ydx_art(update, context, user_id=user_id, text=text)
+        context.user_data["command"] = command
 
     await context.bot.delete_message(
         chat_id=update.effective_chat.id, message_id=status_msg.message_id
@@ -166,7 +191,20 @@ def create_application():
     try:
         logger.info("Start building application")
         Config.validate()
-        application = Application.builder().token(Config.BOT_TOKEN).build()
+        builder = (
+            Application.builder()
+            .token(Config.BOT_TOKEN)
+            # Same pool size as the builder default
+            .request(BotRequest(connection_pool_size=256))
+            .persistence(RedisPersistence(redis_client))
+            .post_init(init_clients)
+            .post_shutdown(close_clients)
+        )
+        if Config.CONCURRENT_UPDATES > 1:
+            builder.concurrent_updates(
+                ChatOrderedUpdateProcessor(Config.CONCURRENT_UPDATES)
+            )
+        application = builder.build()
 
         # Set up second level ConversationHandler (text2text)
         text2text_conv = ConversationHandler(
@@ -192,6 +230,8 @@ def create_application():
                 Config.STOPPING: Config.END,
                 Config.END: Config.SELECTING_ACTION,
             },
+            name="text2text",
+            persistent=True,
         )
         # first-level conversation handler
         conv_handler = ConversationHandler(
@@ -207,9 +247,12 @@ def create_application():
                 ],
             },
             fallbacks=[CommandHandler("stop", stop)],
+            name="main",
+            persistent=True,
         )
         application.add_handler(conv_handler)
         application.add_handler(CommandHandler("help", help))
+        application.add_handler(CommandHandler("job", job_status))
         application.add_error_handler(error_handler)
     except Exception as e:
         logger.error(f"Error creating application: {str(e)}")
@@ -0,0 +1,89 @@
+from typing import Callable
+from loguru import logger
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+# Latency buckets in seconds, up to image generation times
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+REQUESTS = Counter(
+    "bot_requests_total", "Requests by command and backend", ["command", "backend"]
+)
+REQUEST_SECONDS = Histogram(
+    "bot_request_seconds",
+    "Request handling time by command and backend",
+    ["command", "backend"],
+    buckets=BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge("bot_requests_in_flight", "Requests being handled")
+RATE_LIMITED = Counter(
+    "bot_rate_limited_total", "Requests rejected by rate limit", ["backend"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "bot_queue_wait_seconds",
+    "Time waiting for a backend slot by backend and kind",
+    ["backend", "kind"],
+    buckets=BUCKETS,
+)
+QUEUE_WAITING = Gauge(
+    "bot_queue_waiting", "Requests waiting for a backend slot", ["backend"]
+)
+BACKEND_SECONDS = Histogram(
+    "bot_backend_seconds",
+    "Backend call time by backend and operation",
+    ["backend", "operation"],
+    buckets=BUCKETS,
+)
+BACKEND_IN_FLIGHT = Gauge(
+    "bot_backend_in_flight", "Backend calls in progress", ["backend"]
+)
+BACKEND_ERRORS = Counter(
+    "bot_backend_errors_total",
+    "Failed backend calls by backend and error type",
+    ["backend", "error"],
+)
+CIRCUIT_OPEN = Gauge(
+    "bot_circuit_open", "Whether calls to a backend are rejected", ["backend"]
+)
+TELEGRAM_SECONDS = Histogram(
+    "bot_telegram_seconds",
+    "Telegram Bot API request time by method",
+    ["method"],
+    buckets=BUCKETS,
+)
+AUTH_CHECKS = Counter(
+    "bot_auth_checks_total", "Authorization checks by result", ["result"]
+)
+AUTH_SECONDS = Histogram(
+    "bot_auth_seconds", "Authorization check time", buckets=BUCKETS
+)
+REDIS_SECONDS = Histogram(
+    "bot_redis_seconds",
+    "Redis operation time by operation",
+    ["operation"],
+    buckets=BUCKETS,
+)
+CACHE_HIT_RATE = Gauge(
+    "bot_cache_hit_rate", "Hit rate of in-process and Redis caches", ["cache"]
+)
+JOBS = Counter("bot_jobs_total", "Background jobs by status", ["status"])
+JOB_WAIT_SECONDS = Histogram(
+    "bot_job_wait_seconds",
+    "Time from job submission until a worker starts it",
+    buckets=BUCKETS,
+)
+
+
+def start_server(host: str, port: int) -> Callable[[], None]:
+    """
+    Serve metrics at http://host:port/metrics from a background thread,
+    returns a function stopping the server
+    """
+    logger.info(f"Serving metrics on {host}:{port}")
+    server, thread = start_http_server(port, addr=host)
+
+    def stop() -> None:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+    return stop
@@ -0,0 +1,146 @@
+import asyncio
+import json
+
+from typing import Any, Optional
+from loguru import logger
+from telegram.ext import BasePersistence, PersistenceInput
+from mltoolsbot.config import Config
+from mltoolsbot.metrics import REDIS_SECONDS
+from mltoolsbot.redis import AsyncRedisClient
+from mltoolsbot.resilience import RetryPolicy
+
+
+class RedisPersistence(BasePersistence):
+    """
+    Bot persistence storing conversation states, user, chat and bot data in
+    Redis, so they survive restarts and can be shared between bot workers.
+
+    Writes are write-behind: the Application hands over changed entries every
+    update_interval seconds, they are collected in memory and written with a
+    single pipeline instead of one round trip per entry. A failed write is
+    retried with backoff, entries still failing then are written with the
+    next update or flush.
+
+    Data is loaded once on startup, so several workers can only share state
+    when every chat is handled by a single worker at a time.
+    """
+
+    retry = RetryPolicy()
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        prefix: str = Config.PERSISTENCE_PREFIX,
+        update_interval: float = Config.PERSISTENCE_INTERVAL,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        self.redis_client = redis_client
+        self.prefix = prefix
+        # (redis key, hash field or None for plain key) -> json value or None to delete
+        self._pending: dict[tuple[str, Optional[str]], Optional[str]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    async def _load_hash(self, name: str) -> dict[str, Any]:
+        values = await self.redis_client.redis_client.hgetall(self._key(name))
+        return {field: json.loads(value) for field, value in values.items()}
+
+    def _stage(self, key: str, field: Optional[str], value: Any) -> None:
+        self._pending[(key, field)] = None if value is None else json.dumps(value)
+        if self._flush_task is None or self._flush_task.done():
+            # Runs after the rest of the current persistence update is staged
+            self._flush_task = asyncio.create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        attempt = 0
+        # Entries staged while a write is running are written by this task too
+        while self._pending:
+            pending, self._pending = self._pending, {}
+            attempt += 1
+            try:
+                await self._write(pending)
+                attempt = 0
+            except Exception as e:
+                # Keep failed entries unless they were changed again meanwhile
+                self._pending = {**pending, **self._pending}
+                delay = self.retry.delay(attempt)
+                if delay is None:
+                    logger.error(f"Error writing persistence to Redis: {e}")
+                    return
+                logger.warning(f"Writing persistence to Redis failed: {e}, retrying")
+                await asyncio.sleep(delay)
+
+    async def _write(self, pending: dict) -> None:
+        client = self.redis_client.redis_client
+        with REDIS_SECONDS.labels(operation="persist").time():
+            async with client.pipeline(transaction=False) as pipe:
+                for (key, field), value in pending.items():
+                    if field is None and value is None:
+                        pipe.delete(key)
+                    elif field is None:
+                        pipe.set(key, value)
+                    elif value is None:
+                        pipe.hdel(key, field)
+                    else:
+                        pipe.hset(key, field, value)
+                await pipe.execute()
+        logger.info(f"Persisted {len(pending)} entries to redis")
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {int(k): v for k, v in (await self._load_hash("user_data")).items()}
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return {int(k): v for k, v in (await self._load_hash("chat_data")).items()}
+
+    async def get_bot_data(self) -> dict:
+        value = await self.redis_client.redis_client.get(self._key("bot_data"))
+        return json.loads(value) if value else {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> dict[tuple, object]:
+        states = await self._load_hash(f"conversations:{name}")
+        return {tuple(json.loads(key)): state for key, state in states.items()}
+
+    async def update_conversation(
+        self, name: str, key: tuple, new_state: Optional[object]
+    ) -> None:
+        self._stage(self._key(f"conversations:{name}"), json.dumps(key), new_state)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage(self._key("user_data"), str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage(self._key("chat_data"), str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._stage(self._key("bot_data"), None, data)
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._stage(self._key("user_data"), str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._stage(self._key("chat_data"), str(chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        await self._write_pending()
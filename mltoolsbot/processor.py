@@ -0,0 +1,65 @@
+import asyncio
+
+from typing import Any, Awaitable, Hashable, Optional
+from telegram.ext import BaseUpdateProcessor
+
+# PTB's semaphore is taken before the chat lock, updates waiting for a busy
+# chat would hold its slots, so it is made large enough to never block
+UNBOUNDED = 2**16
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Process updates concurrently while keeping updates of one chat sequential.
+
+    Up to max_concurrent_updates updates are handled at once, but an update
+    waits for the previous update of the same chat to finish, so a slow image
+    generation only delays its own chat and conversation state transitions
+    stay ordered.
+    """
+
+    _limit: Optional[int] = None
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(UNBOUNDED)
+        self._limit = max_concurrent_updates
+        # Taken after the chat lock, only updates ready to run count
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # chat key -> [lock, number of updates holding or waiting for it]
+        self._chats: dict[Hashable, list] = {}
+
+    @property
+    def max_concurrent_updates(self) -> int:
+        return self._limit or super().max_concurrent_updates
+
+    @staticmethod
+    def chat_key(update: object) -> Optional[Hashable]:
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return chat.id
+        user = getattr(update, "effective_user", None)
+        return ("user", user.id) if user is not None else None
+
+    async def do_process_update(
+        self, update: object, coroutine: Awaitable[Any]
+    ) -> None:
+        key = self.chat_key(update)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+        entry = self._chats.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._chats.clear()
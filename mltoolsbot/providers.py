@@ -0,0 +1,448 @@
+import asyncio
+import json
+import httpx
+
+from contextlib import contextmanager
+from functools import cache, cached_property, partial
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, Optional
+from loguru import logger
+from mltoolsbot import deadline
+from mltoolsbot.config import Config
+from mltoolsbot.images import ImageDecoder
+from mltoolsbot.metrics import BACKEND_ERRORS, BACKEND_IN_FLIGHT, BACKEND_SECONDS
+from mltoolsbot.clients import HttpClients
+from mltoolsbot.exceptions import CircuitOpenError, HandlerError, TimeoutError
+from mltoolsbot.resilience import CircuitBreaker, RetryPolicy
+
+# Overloaded or temporarily failing backend
+RETRY_STATUSES = {429, 500, 502, 503, 504, 529}
+
+
+@cache
+def yandex_sdk():
+    """
+    Yandex Cloud ML SDK shared by Yandex providers, imported on first use
+    """
+    from yandex_cloud_ml_sdk import AsyncYCloudML
+
+    logger.info("Init yandex cloud ml client")
+    return AsyncYCloudML(folder_id=Config.YDX_FOLDER_ID, auth=Config.YDX_API_KEY)
+
+
+class Provider:
+    """
+    Generation backend behind a common async interface.
+
+    Messages are dicts with "role" and "content". Subclasses implement the
+    underscored methods they support, the public methods wrap them and are
+    the single place for behaviour shared by every backend. Calls are
+    cancelled after the backend's timeout from Config.BACKEND_TIMEOUTS or
+    when the update's deadline passes, whichever comes first. Transient
+    errors are retried with backoff within that time, and a circuit breaker
+    per backend rejects calls while the backend keeps failing.
+
+    SDK clients are created on first request, so a deployment does not import
+    or set up SDKs of backends it never uses.
+    """
+
+    name: str = ""
+    # "text" or "image"
+    kind: str = "text"
+    retry = RetryPolicy()
+    # Whether _probe checks the backend, the circuit is then driven by it
+    probed: bool = False
+
+    def cache_params(self) -> dict:
+        """
+        Settings that together with the request determine the response
+        """
+        return {}
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return Config.BACKEND_TIMEOUTS.get(self.name)
+
+    @cached_property
+    def breaker(self) -> CircuitBreaker:
+        return CircuitBreaker(self.name)
+
+    def is_transient(self, e: Exception) -> bool:
+        """
+        Whether the error may go away on retry and indicates backend trouble
+        """
+        if isinstance(e, httpx.HTTPStatusError):
+            return e.response.status_code in RETRY_STATUSES
+        return isinstance(e, (httpx.TransportError, asyncio.TimeoutError, TimeoutError))
+
+    def _is_failure(self, own_timeout: bool, e: Exception) -> Optional[bool]:
+        """
+        Whether e counts against the circuit. Timeouts caused by the update's
+        deadline rather than the backend's own timeout tell nothing.
+        """
+        if isinstance(e, TimeoutError) and not own_timeout:
+            return None
+        return self.is_transient(e)
+
+    def _guard(self, end: Optional[float]) -> Callable[[Exception], Optional[bool]]:
+        """
+        Failure check for a call ending at end, raises if the update's
+        budget is spent already so the call never reaches the breaker
+        """
+        if deadline.expired():
+            raise TimeoutError(f"Deadline exceeded before {self.name}")
+        own_timeout = end is not None and end != deadline.expires()
+        return partial(self._is_failure, own_timeout)
+
+    @contextmanager
+    def _track(self, operation: str) -> Iterator[None]:
+        """
+        Record duration, concurrency and failures of a backend call
+        """
+        try:
+            with (
+                BACKEND_IN_FLIGHT.labels(backend=self.name).track_inprogress(),
+                BACKEND_SECONDS.labels(backend=self.name, operation=operation).time(),
+            ):
+                yield
+        except CircuitOpenError:
+            BACKEND_ERRORS.labels(backend=self.name, error="circuit_open").inc()
+            raise
+        except (httpx.TimeoutException, asyncio.TimeoutError, TimeoutError):
+            BACKEND_ERRORS.labels(backend=self.name, error="timeout").inc()
+            raise
+        except Exception:
+            BACKEND_ERRORS.labels(backend=self.name, error="error").inc()
+            raise
+
+    async def _backoff(self, e: Exception, attempt: int, end: Optional[float]) -> bool:
+        """
+        Wait before retrying after a failed attempt, False to give up
+        """
+        delay = self.retry.delay(attempt) if self.is_transient(e) else None
+        if delay is None:
+            return False
+        if end is not None and asyncio.get_running_loop().time() + delay >= end:
+            return False
+        logger.warning(f"{self.name} attempt {attempt} failed: {e!r}, retrying")
+        await asyncio.sleep(delay)
+        return True
+
+    async def _call(self, operation: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func with retries, within the backend's timeout for all attempts
+        """
+        end = deadline.expires(self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            is_failure = self._guard(end)
+            try:
+                with self._track(operation), self.breaker.call(is_failure):
+                    async with deadline.timeout_at(end, self.name):
+                        return await func()
+            except Exception as e:
+                if not await self._backoff(e, attempt, end):
+                    raise
+
+    async def generate_text(self, system: str, messages: list[dict]) -> str:
+        logger.info(f"Request to {self.name}")
+        response = await self._call(
+            "text", lambda: self._generate_text(system, messages)
+        )
+        logger.info(f"Response received from {self.name}")
+        return response
+
+    async def stream_text(
+        self, system: str, messages: list[dict]
+    ) -> AsyncIterator[str]:
+        """
+        Yield cumulative response text as it is generated
+        """
+        logger.info(f"Streaming request to {self.name}")
+        # Deadline is applied to each chunk, time spent by the consumer
+        # between chunks counts as well
+        end = deadline.expires(self.timeout)
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            is_failure = self._guard(end)
+            chunks = self._stream_text(system, messages)
+            try:
+                with self._track("stream"), self.breaker.call(is_failure):
+                    while True:
+                        async with deadline.timeout_at(end, self.name):
+                            try:
+                                text = await anext(chunks)
+                            except StopAsyncIteration:
+                                break
+                        started = True
+                        yield text
+                break
+            except Exception as e:
+                # Text already shown to the user can not be taken back
+                if started or not await self._backoff(e, attempt, end):
+                    raise
+            finally:
+                await chunks.aclose()
+        logger.info(f"Response received from {self.name}")
+
+    async def generate_image(self, prompt: str) -> bytes:
+        logger.info(f"Request for image to {self.name}")
+        image = await self._call("image", lambda: self._generate_image(prompt))
+        logger.info(f"Image received from {self.name}")
+        return image
+
+    async def probe(self) -> None:
+        """
+        Check backend health, the circuit is opened while the check fails
+        """
+        try:
+            async with deadline.timeout(Config.HEALTH_CHECK_TIMEOUT, self.name):
+                await self._probe()
+        except Exception as e:
+            logger.warning(f"Health check of {self.name} failed: {e!r}")
+            self.breaker.open()
+        else:
+            self.breaker.close()
+
+    async def _probe(self) -> None:
+        pass
+
+    async def _generate_text(self, system: str, messages: list[dict]) -> str:
+        raise NotImplementedError(f"{self.name} does not generate text")
+
+    async def _stream_text(
+        self, system: str, messages: list[dict]
+    ) -> AsyncIterator[str]:
+        # Backends without streaming deliver the whole response at once
+        yield await self._generate_text(system, messages)
+
+    async def _generate_image(self, prompt: str) -> bytes:
+        raise NotImplementedError(f"{self.name} does not generate images")
+
+
+class ClaudeProvider(Provider):
+    name = Config.CLAUDE
+    model = "claude-3-5-sonnet-20241022"
+    params = {"max_tokens": 1024, "temperature": 0}
+
+    @cached_property
+    def client(self):
+        from anthropic import AsyncAnthropic
+
+        logger.info("Init anthropic client")
+        # Retries are done by Provider
+        return AsyncAnthropic(api_key=Config.ANTHROPIC_TOKEN, max_retries=0)
+
+    def is_transient(self, e: Exception) -> bool:
+        import anthropic
+
+        if isinstance(e, anthropic.APIStatusError):
+            return e.status_code in RETRY_STATUSES
+        return isinstance(e, anthropic.APIConnectionError) or super().is_transient(e)
+
+    def cache_params(self) -> dict:
+        return {"model": self.model, **self.params}
+
+    async def _generate_text(self, system: str, messages: list[dict]) -> str:
+        response = await self.client.messages.create(
+            model=self.model, system=system, messages=messages, **self.params
+        )
+        return response.content[0].text
+
+    async def _stream_text(
+        self, system: str, messages: list[dict]
+    ) -> AsyncIterator[str]:
+        text = ""
+        async with self.client.messages.stream(
+            model=self.model, system=system, messages=messages, **self.params
+        ) as stream:
+            async for chunk in stream.text_stream:
+                text += chunk
+                yield text
+
+
+def is_grpc_transient(e: Exception) -> bool:
+    import grpc
+
+    return isinstance(e, grpc.aio.AioRpcError) and e.code() in (
+        grpc.StatusCode.UNAVAILABLE,
+        grpc.StatusCode.RESOURCE_EXHAUSTED,
+        grpc.StatusCode.DEADLINE_EXCEEDED,
+    )
+
+
+class YandexGPTProvider(Provider):
+    name = Config.YDX_GPT
+    params = {"temperature": 0.5}
+    # The SDK retries unavailable and exhausted calls itself
+    retry = RetryPolicy(attempts=1)
+
+    def is_transient(self, e: Exception) -> bool:
+        return is_grpc_transient(e) or super().is_transient(e)
+
+    @cached_property
+    def model(self):
+        return yandex_sdk().models.completions("yandexgpt").configure(**self.params)
+
+    def cache_params(self) -> dict:
+        return {"model": "yandexgpt", **self.params}
+
+    @staticmethod
+    def _messages(system: str, messages: list[dict]) -> list[dict]:
+        system = [{"role": "system", "text": system}] if system else []
+        return system + [{"role": m["role"], "text": m["content"]} for m in messages]
+
+    async def _generate_text(self, system: str, messages: list[dict]) -> str:
+        response = await self.model.run(self._messages(system, messages))
+        return response.alternatives[0].text
+
+    async def _stream_text(
+        self, system: str, messages: list[dict]
+    ) -> AsyncIterator[str]:
+        async for result in self.model.run_stream(self._messages(system, messages)):
+            yield result.alternatives[0].text
+
+
+class OllamaProvider(Provider):
+    name = Config.OLLAMA
+
+    def __init__(self, http_clients: HttpClients):
+        self.http_clients = http_clients
+
+    def cache_params(self) -> dict:
+        return {"model": Config.OLLAMA_PAYLOAD["model"]}
+
+    @staticmethod
+    def _payload(system: str, messages: list[dict], stream: bool) -> dict:
+        # /api/generate takes a single prompt, so only the last message is sent
+        payload = {**Config.OLLAMA_PAYLOAD, "prompt": messages[-1]["content"]}
+        payload["stream"] = stream
+        if system:
+            payload["system"] = system
+        return payload
+
+    async def _generate_text(self, system: str, messages: list[dict]) -> str:
+        response = await self.http_clients.ollama.post(
+            url="/api/generate", json=self._payload(system, messages, stream=False)
+        )
+        response.raise_for_status()
+        return response.json()["response"]
+
+    async def _stream_text(
+        self, system: str, messages: list[dict]
+    ) -> AsyncIterator[str]:
+        text = ""
+        async with self.http_clients.ollama.stream(
+            "POST",
+            url="/api/generate",
+            json=self._payload(system, messages, stream=True),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                text += chunk.get("response", "")
+                yield text
+                if chunk.get("done"):
+                    break
+
+
+class YandexArtProvider(Provider):
+    name = Config.YDX_ART
+    kind = "image"
+    retry = RetryPolicy(attempts=1)
+
+    def is_transient(self, e: Exception) -> bool:
+        return is_grpc_transient(e) or super().is_transient(e)
+
+    @cached_property
+    def model(self):
+        return (
+            yandex_sdk()
+            .models.image_generation("yandex-art")
+            .configure(**Config.YDX_ART_CONFIG)
+        )
+
+    def cache_params(self) -> dict:
+        return Config.YDX_ART_CONFIG
+
+    async def _generate_image(self, prompt: str) -> bytes:
+        operation = await self.model.run_deferred(prompt)
+        # timeout of wait applies to each status request, poll_timeout to all
+        response = await operation.wait(
+            poll_timeout=int(Config.YDX_ART_TIMEOUT),
+            poll_interval=Config.YDX_ART_POLL_INTERVAL,
+        )
+        return response.image_bytes
+
+
+class StableDiffusionProvider(Provider):
+    name = Config.SD
+    kind = "image"
+
+    def __init__(self, http_clients: HttpClients):
+        self.http_clients = http_clients
+
+    def cache_params(self) -> dict:
+        return Config.SD_PAYLOAD
+
+    @property
+    def probed(self) -> bool:
+        return bool(Config.SD_SERVER_URL)
+
+    async def _probe(self) -> None:
+        response = await self.http_clients.sd.get(url="/sdapi/v1/progress")
+        response.raise_for_status()
+
+    async def _generate_image(self, prompt: str) -> bytes:
+        [image, *_] = await self._txt2img({**Config.SD_PAYLOAD, "prompt": prompt})
+        return image
+
+    async def _txt2img(self, payload: dict) -> list[bytes]:
+        """
+        Images decoded while the response streams in, the base64 JSON of a
+        large image never sits in memory as a whole
+        """
+        decoder = ImageDecoder()
+        async with self.http_clients.sd.stream(
+            "POST", url="/sdapi/v1/txt2img", json=payload
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                decoder.feed(chunk)
+        if not decoder.images:
+            raise ValueError("No images in txt2img response")
+        return decoder.images
+
+
+class ProviderRegistry:
+    """
+    Providers by backend name, commands are resolved through
+    Config.COMMAND_BACKENDS.
+    """
+
+    def __init__(self):
+        self._providers: dict[str, Provider] = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._providers
+
+    def __iter__(self) -> Iterator[Provider]:
+        return iter(self._providers.values())
+
+    def register(self, provider: Provider) -> None:
+        self._providers[provider.name] = provider
+
+    def get(self, name: str) -> Provider:
+        try:
+            return self._providers[name]
+        except KeyError:
+            raise HandlerError(f"Unknown backend: {name}")
+
+    def for_command(self, command: str) -> Provider:
+        if command not in Config.COMMAND_BACKENDS:
+            raise HandlerError(f"Unknown command: {command}")
+        return self.get(Config.COMMAND_BACKENDS[command])
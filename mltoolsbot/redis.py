@@ -1,8 +1,10 @@
 import json
 from redis import Redis
-from typing import Optional, Any
+from redis.asyncio import BlockingConnectionPool, Redis as AsyncRedis
+from typing import Optional, Any, Callable
 from loguru import logger
 from mltoolsbot.config import Config
+from mltoolsbot.metrics import REDIS_SECONDS
 
 
 class RedisClient:
@@ -64,3 +66,171 @@ class RedisClient:
         except Exception as e:
             print(f"Error deleting value from Redis: {e}")
             return False
+
+
+class AsyncRedisClient:
+    """
+    Asyncio counterpart of RedisClient backed by an explicit connection pool.
+    """
+
+    def __init__(self):
+        self._pool: Optional[BlockingConnectionPool] = None
+        self._client: Optional[AsyncRedis] = None
+
+    @property
+    def redis_client(self) -> AsyncRedis:
+        """
+        Client over a connection pool created on first use
+        """
+        if self._client is None:
+            logger.info(
+                f"Init async redis client: {Config.REDIS_HOST}:{Config.REDIS_PORT}"
+            )
+            self._pool = BlockingConnectionPool(
+                host=Config.REDIS_HOST,
+                port=Config.REDIS_PORT,
+                decode_responses=True,
+                max_connections=Config.REDIS_MAX_CONNECTIONS,
+                timeout=Config.REDIS_POOL_TIMEOUT,
+                health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+                socket_timeout=Config.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=Config.REDIS_SOCKET_TIMEOUT,
+            )
+            self._client = AsyncRedis(connection_pool=self._pool)
+        return self._client
+
+    async def set_value(
+        self, key: str, value: Any, expire_seconds: Optional[int] = None
+    ) -> bool:
+        """
+        Store a value in Redis with optional expiration
+        """
+        try:
+            logger.info("Set value to redis")
+            if not isinstance(value, (str, int, float, bool)):
+                value = json.dumps(value)
+
+            with REDIS_SECONDS.labels(operation="set").time():
+                await self.redis_client.set(key, value, ex=expire_seconds)
+            return True
+        except Exception as e:
+            logger.error(f"Error setting value in Redis: {e}")
+            return False
+
+    async def get_value(
+        self, key: str, default: Any = None, raise_errors: bool = False
+    ) -> Any:
+        """
+        Retrieve a value from Redis, errors return default unless raise_errors
+        """
+        try:
+            logger.info("Get data from redis")
+            with REDIS_SECONDS.labels(operation="get").time():
+                value = await self.redis_client.get(key)
+            if value is None:
+                return default
+            try:
+                return json.loads(value)
+            except json.JSONDecodeError:
+                return value
+        except Exception as e:
+            logger.error(f"Error getting value from Redis: {e}")
+            if raise_errors:
+                raise
+            return default
+
+    async def delete_value(self, key: str) -> bool:
+        """
+        Delete a value from Redis
+        """
+        try:
+            with REDIS_SECONDS.labels(operation="delete").time():
+                return bool(await self.redis_client.delete(key))
+        except Exception as e:
+            logger.error(f"Error deleting value from Redis: {e}")
+            return False
+
+    async def push_values(
+        self,
+        key: str,
+        values: list[Any],
+        max_len: Optional[int] = None,
+        expire_seconds: Optional[int] = None,
+    ) -> bool:
+        """
+        Append values to a Redis list, keeping only the last max_len items
+        """
+        try:
+            logger.info("Push values to redis list")
+            values = [
+                v if isinstance(v, (str, int, float, bool)) else json.dumps(v)
+                for v in values
+            ]
+            with REDIS_SECONDS.labels(operation="push").time():
+                async with self.redis_client.pipeline(transaction=True) as pipe:
+                    pipe.rpush(key, *values)
+                    if max_len:
+                        pipe.ltrim(key, -max_len, -1)
+                    if expire_seconds:
+                        pipe.expire(key, expire_seconds)
+                    await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error pushing values to Redis: {e}")
+            return False
+
+    async def get_list(self, key: str, start: int = 0, end: int = -1) -> list[Any]:
+        """
+        Retrieve a range of a Redis list
+        """
+        try:
+            logger.info("Get list from redis")
+            with REDIS_SECONDS.labels(operation="lrange").time():
+                values = await self.redis_client.lrange(key, start, end)
+            result = []
+            for value in values:
+                try:
+                    result.append(json.loads(value))
+                except json.JSONDecodeError:
+                    result.append(value)
+            return result
+        except Exception as e:
+            logger.error(f"Error getting list from Redis: {e}")
+            return []
+
+    async def listen(self, channel: str, handler: Callable[[str], Any]) -> None:
+        """
+        Call handler with every message published to channel until cancelled.
+        The subscription has its own connection without the pool's socket
+        timeout, a quiet channel is not an error; dead connections are still
+        detected by health checks between polls.
+        """
+        client = AsyncRedis(
+            host=Config.REDIS_HOST,
+            port=Config.REDIS_PORT,
+            decode_responses=True,
+            health_check_interval=Config.REDIS_HEALTH_CHECK_INTERVAL,
+            socket_connect_timeout=Config.REDIS_SOCKET_TIMEOUT,
+        )
+        try:
+            async with client.pubsub(ignore_subscribe_messages=True) as pubsub:
+                await pubsub.subscribe(channel)
+                while True:
+                    message = await pubsub.get_message(
+                        timeout=Config.REDIS_HEALTH_CHECK_INTERVAL
+                    )
+                    if message and message["type"] == "message":
+                        handler(message["data"])
+        finally:
+            await client.aclose()
+
+    async def close(self) -> None:
+        """
+        Close the client and disconnect pooled connections
+        """
+        if self._client is None:
+            return
+        logger.info("Close async redis client")
+        await self._client.aclose()
+        await self._pool.disconnect()
+        self._client = self._pool = None
@@ -0,0 +1,118 @@
+import random
+import time
+
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from loguru import logger
+from mltoolsbot.config import Config
+from mltoolsbot.exceptions import CircuitOpenError
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter: the delay before retry n is
+    uniformly random between 0 and base_delay * 2 ** (n - 1), capped at
+    max_delay, so clients retrying after a shared failure spread out.
+    """
+
+    def __init__(
+        self,
+        attempts: int = Config.RETRY_ATTEMPTS,
+        base_delay: float = Config.RETRY_BASE_DELAY,
+        max_delay: float = Config.RETRY_MAX_DELAY,
+    ):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> Optional[float]:
+        """
+        Delay before the attempt following attempt, None if it was the last
+        """
+        if attempt >= self.attempts:
+            return None
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        )
+
+
+class CircuitBreaker:
+    """
+    Fast-fail calls to a backend that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    raise CircuitOpenError without reaching the backend. After reset_timeout
+    a single trial call is let through (half-open), its success closes the
+    circuit and its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = Config.BREAKER_FAILURES,
+        reset_timeout: float = Config.BREAKER_RESET_TIMEOUT,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.trial or time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def open(self) -> None:
+        if self.opened_at is None:
+            logger.warning(f"Circuit for {self.name} opened")
+        self.opened_at = time.monotonic()
+        self.trial = False
+
+    def close(self) -> None:
+        if self.opened_at is not None:
+            logger.info(f"Circuit for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.open()
+
+    @contextmanager
+    def call(self, is_failure: Callable[[Exception], Optional[bool]]) -> Iterator[None]:
+        """
+        Guard a backend call, exceptions for which is_failure is true count
+        as failures, None if they tell nothing about the backend, any other
+        outcome shows the backend is reachable
+        """
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(f"{self.name} is unavailable")
+        trial = state == "half-open"
+        self.trial = trial
+        try:
+            yield
+        except Exception as e:
+            failure = is_failure(e)
+            if failure:
+                self.record_failure()
+            elif failure is None:
+                if trial:
+                    self.trial = False
+            else:
+                self.close()
+            raise
+        except BaseException:
+            # Cancelled trial, let the next call try again
+            if trial:
+                self.trial = False
+            raise
+        else:
+            self.close()
@@ -1,16 +1,42 @@
 import sys
-from telegram import Update
+import asyncio
 from loguru import logger
-from mltoolsbot.main_bot_v2 import create_application
+from mltoolsbot.api import redis_client
+from mltoolsbot.config import Config
+from mltoolsbot.main_bot_v2 import ALLOWED_UPDATES, create_application
+from mltoolsbot.workers import (
+    UpdateStream,
+    create_ingress_application,
+    run_jobs,
+    run_worker,
+)
 from mltoolsbot.exceptions import BotError
 
 
 def main():
     """Main entry point for the bot."""
     try:
-        app = create_application()
-        logger.info("Starting bot...")
-        app.run_polling(allowed_updates=Update.ALL_TYPES)
+        Config.validate()
+        logger.info(f"Starting bot in {Config.BOT_MODE} mode...")
+        if Config.BOT_MODE in ("webhook", "ingress"):
+            if Config.BOT_MODE == "ingress":
+                app = create_ingress_application(UpdateStream(redis_client))
+            else:
+                app = create_application()
+            app.run_webhook(
+                listen=Config.WEBHOOK_LISTEN,
+                port=Config.WEBHOOK_PORT,
+                url_path=Config.WEBHOOK_PATH,
+                webhook_url=f"{Config.WEBHOOK_URL.rstrip('/')}/{Config.WEBHOOK_PATH}",
+                secret_token=Config.WEBHOOK_SECRET,
+                allowed_updates=ALLOWED_UPDATES,
+            )
+        elif Config.BOT_MODE == "worker":
+            asyncio.run(run_worker(create_application(), UpdateStream(redis_client)))
+        elif Config.BOT_MODE == "jobs":
+            asyncio.run(run_jobs(create_application()))
+        else:
+            create_application().run_polling(allowed_updates=ALLOWED_UPDATES)
     except BotError as e:
         logger.error(f"Bot error: {str(e)}")
         sys.exit(1)
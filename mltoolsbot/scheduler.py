@@ -0,0 +1,200 @@
+import asyncio
+import itertools
+import time
+
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from aiolimiter import AsyncLimiter
+from loguru import logger
+from mltoolsbot import deadline
+from mltoolsbot.cache import TTLCache
+from mltoolsbot.config import Config
+from mltoolsbot.exceptions import RateLimitError
+
+
+class WaitStats:
+    """Queue wait time statistics for one backend or request kind."""
+
+    def __init__(self, samples: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # Recent waits for percentiles
+        self.samples: deque[float] = deque(maxlen=samples)
+
+    def add(self, wait: float) -> None:
+        self.count += 1
+        self.total += wait
+        self.max = max(self.max, wait)
+        self.samples.append(wait)
+
+    def percentile(self, q: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[round(q * (len(ordered) - 1))]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+        }
+
+
+class AdmissionController:
+    """
+    Admission control in front of backend calls.
+
+    A request is admitted when the user's token bucket has capacity, then
+    waits for a free slot of its backend and of the global limit. Users that
+    exhausted their bucket are rejected with RateLimitError.
+
+    Waiting requests are served by weighted fair queuing: each one is tagged
+    with a virtual finish time, the user's previous tag (or the current
+    virtual time if later) plus the cost of its kind divided by the user's
+    weight, and free slots go to the lowest tag. A user flooding a backend
+    only pushes their own tags back, cheap text requests overtake image
+    requests, and users with a higher weight get a larger share.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = Config.USER_RATE_LIMIT,
+        user_period: float = Config.USER_RATE_PERIOD,
+        backend_limits: Optional[dict[str, int]] = None,
+        global_limit: int = Config.GLOBAL_CONCURRENCY,
+        kind_costs: Optional[dict[str, float]] = None,
+        max_users: int = 10000,
+    ):
+        self.user_rate = user_rate
+        self.user_period = user_period
+        self.users = TTLCache(maxsize=max_users, ttl=user_period * 10)
+        self.limits = dict(backend_limits or Config.BACKEND_CONCURRENCY)
+        self.global_limit = global_limit
+        self.kind_costs = kind_costs or Config.KIND_COSTS
+        # user -> virtual finish time of their last request
+        self.finish_tags = TTLCache(maxsize=max_users, ttl=user_period * 10)
+        self.virtual_time = 0.0
+        # (finish tag, sequence, start tag, backend, future) of waiting requests
+        self.queue: list[tuple[float, int, float, str, asyncio.Future]] = []
+        self.sequence = itertools.count()
+        self.waiting = {name: 0 for name in self.limits}
+        self.in_flight = {name: 0 for name in self.limits}
+        self.wait_stats = {name: WaitStats() for name in self.limits}
+        self.kind_wait_stats = {kind: WaitStats() for kind in self.kind_costs}
+        self.rejected = 0
+
+    def _user_limiter(self, user_id: str) -> AsyncLimiter:
+        limiter = self.users.get(user_id)
+        if limiter is None:
+            limiter = AsyncLimiter(self.user_rate, self.user_period)
+        # Refresh expiration on every request so active users keep their bucket
+        self.users.set(user_id, limiter)
+        return limiter
+
+    def _enqueue(
+        self, user_id: str, backend: str, kind: str, weight: float
+    ) -> tuple[float, int, float, str, asyncio.Future]:
+        start_tag = max(self.virtual_time, self.finish_tags.get(user_id, 0.0))
+        finish_tag = start_tag + self.kind_costs.get(kind, 1) / max(weight, 1e-3)
+        self.finish_tags.set(user_id, finish_tag)
+        future = asyncio.get_running_loop().create_future()
+        entry = (finish_tag, next(self.sequence), start_tag, backend, future)
+        self.queue.append(entry)
+        return entry
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting requests in tag order."""
+        for entry in sorted(self.queue):
+            if sum(self.in_flight.values()) >= self.global_limit:
+                break
+            _, _, start_tag, backend, future = entry
+            if self.in_flight[backend] < self.limits[backend]:
+                self.queue.remove(entry)
+                self.in_flight[backend] += 1
+                self.virtual_time = max(self.virtual_time, start_tag)
+                future.set_result(None)
+
+    def _release(self, backend: str) -> None:
+        self.in_flight[backend] -= 1
+        self._dispatch()
+
+    def position(self, entry: tuple) -> int:
+        """Place of a waiting request among those waiting for its backend."""
+        return sum(1 for e in self.queue if e[3] == entry[3] and e[:2] <= entry[:2])
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        user_id: str,
+        backend: Optional[str],
+        on_queued: Optional[Callable[[int], Awaitable]] = None,
+        kind: str = "text",
+        weight: float = 1,
+        limit_rate: bool = True,
+    ) -> AsyncIterator[float]:
+        """
+        Hold a backend slot for the duration of the block, yields wait time.
+        Without backend only the user's rate is checked, limit_rate=False
+        skips that for work the user was charged for when it was queued.
+        """
+        if limit_rate:
+            limiter = self._user_limiter(user_id)
+            if not limiter.has_capacity():
+                self.rejected += 1
+                logger.info(f"User {user_id} rate limited")
+                raise RateLimitError("Too many requests")
+            await limiter.acquire()
+        if backend is None:
+            yield 0.0
+            return
+
+        if backend not in self.limits:
+            raise KeyError(backend)
+        start = time.monotonic()
+        entry = self._enqueue(user_id, backend, kind, weight)
+        future = entry[-1]
+        self.waiting[backend] += 1
+        try:
+            self._dispatch()
+            # Waiting draws from the update's budget like everything else
+            async with deadline.timeout(None, "queue"):
+                if not future.done() and on_queued:
+                    try:
+                        await on_queued(self.position(entry))
+                    except Exception as e:
+                        # Telling the position is a courtesy, keep waiting
+                        logger.warning(f"Queue position not delivered: {e}")
+                await future
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Slot was granted while the request was being cancelled
+                self._release(backend)
+            else:
+                future.cancel()
+                self.queue.remove(entry)
+            raise
+        finally:
+            self.waiting[backend] -= 1
+        wait = time.monotonic() - start
+        self.wait_stats[backend].add(wait)
+        self.kind_wait_stats.setdefault(kind, WaitStats()).add(wait)
+        try:
+            yield wait
+        finally:
+            self._release(backend)
+
+    def stats(self) -> dict:
+        return {
+            "rejected": self.rejected,
+            "waiting": dict(self.waiting),
+            "in_flight": dict(self.in_flight),
+            "wait": {name: s.as_dict() for name, s in self.wait_stats.items()},
+            "kind_wait": {
+                kind: s.as_dict() for kind, s in self.kind_wait_stats.items()
+            },
+        }
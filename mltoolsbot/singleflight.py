@@ -0,0 +1,55 @@
+import asyncio
+
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one.
+
+    The first caller for a key runs the call, callers arriving while it is in
+    flight wait for and share its result (or exception). If the running
+    caller is cancelled, a waiting caller runs the call in its place.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+        self.calls = 0
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """
+        Return result of func and whether it was shared from another caller
+        """
+        while (future := self._calls.get(key)) is not None:
+            # Unlike awaiting the future, cancelling the waiter leaves it alone
+            await asyncio.wait([future])
+            if not future.cancelled():
+                self.shared += 1
+                return future.result(), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Nobody may be waiting, do not report unretrieved exceptions
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        self.calls += 1
+        try:
+            result = await func()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "saved": self.shared, "in_flight": len(self)}
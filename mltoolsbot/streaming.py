@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from typing import AsyncIterator, Optional
+from loguru import logger
+from telegram import Bot
+from telegram.constants import MessageLimit
+from telegram.error import BadRequest, RetryAfter
+from mltoolsbot.config import Config
+
+
+class StreamingMessage:
+    """
+    Telegram message that is progressively edited while a response streams in.
+
+    Edits are coalesced: the message is updated at most once per interval
+    seconds and only when the text actually changed, which keeps the bot well
+    under Telegram's per-chat edit limits. Text above the message length limit
+    is sent as additional messages when the stream finishes.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        chat_id: int,
+        interval: float = Config.STREAM_EDIT_INTERVAL,
+    ):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.interval = interval
+        self.text = ""
+        self.message_id: Optional[int] = None
+        self._sent_text = ""
+        self._last_edit = 0.0
+
+    async def update(self, text: str) -> None:
+        """
+        Set full text received so far, editing the message if it is due
+        """
+        self.text = text
+        if not text.strip():
+            return
+        if self.message_id is None:
+            await self._send()
+        elif time.monotonic() - self._last_edit >= self.interval:
+            try:
+                await self._edit()
+            except RetryAfter as e:
+                logger.warning(f"Edit rate limited, retry after {e.retry_after}s")
+                self._last_edit = time.monotonic() + e.retry_after
+
+    async def finish(self) -> str:
+        """
+        Flush the remaining text and return the complete response
+        """
+        if self.message_id is None:
+            if self.text.strip():
+                await self._send()
+        else:
+            while True:
+                try:
+                    await self._edit()
+                    break
+                except RetryAfter as e:
+                    await asyncio.sleep(e.retry_after)
+        limit = MessageLimit.MAX_TEXT_LENGTH
+        for start in range(limit, len(self.text), limit):
+            await self.bot.send_message(
+                chat_id=self.chat_id, text=self.text[start : start + limit]
+            )
+        return self.text
+
+    async def _send(self) -> None:
+        text = self.text[: MessageLimit.MAX_TEXT_LENGTH]
+        message = await self.bot.send_message(chat_id=self.chat_id, text=text)
+        self.message_id = message.message_id
+        self._sent_text = text
+        self._last_edit = time.monotonic()
+
+    async def _edit(self) -> None:
+        text = self.text[: MessageLimit.MAX_TEXT_LENGTH]
+        if text == self._sent_text:
+            return
+        try:
+            await self.bot.edit_message_text(
+                chat_id=self.chat_id, message_id=self.message_id, text=text
+            )
+            self._sent_text = text
+            self._last_edit = time.monotonic()
+        except BadRequest as e:
+            if "not modified" not in str(e):
+                raise
+
+
+async def stream_text(bot: Bot, chat_id: int, chunks: AsyncIterator[str]) -> str:
+    """
+    Stream cumulative response text into a single Telegram message
+    """
+    message = StreamingMessage(bot, chat_id)
+    async for text in chunks:
+        await message.update(text)
+    return await message.finish()
@@ -0,0 +1,175 @@
+import asyncio
+import json
+
+from typing import Optional
+from loguru import logger
+from redis.exceptions import ResponseError
+from telegram import Update
+from telegram.ext import Application, ContextTypes, TypeHandler
+from mltoolsbot.config import Config
+from mltoolsbot.redis import AsyncRedisClient
+
+
+class UpdateStream:
+    """
+    Telegram updates distributed over partitioned Redis streams.
+
+    Updates are partitioned by chat id, every partition is consumed by exactly
+    one worker through a consumer group, so updates of one chat are always
+    handled by the same worker in the order they arrived.
+    """
+
+    def __init__(
+        self,
+        redis_client: AsyncRedisClient,
+        partitions: int = Config.STREAM_PARTITIONS,
+        prefix: str = Config.STREAM_PREFIX,
+        group: str = "workers",
+    ):
+        self.redis_client = redis_client
+        self.partitions = partitions
+        self.prefix = prefix
+        self.group = group
+
+    def key(self, partition: int) -> str:
+        return f"{self.prefix}:{partition}"
+
+    def partition(self, update: Update) -> int:
+        chat = update.effective_chat
+        user = update.effective_user
+        chat_id = chat.id if chat else user.id if user else 0
+        return chat_id % self.partitions
+
+    def worker_partitions(self, worker_id: int, workers: int) -> list[int]:
+        return [p for p in range(self.partitions) if p % workers == worker_id]
+
+    async def publish(self, update: Update) -> None:
+        """
+        Append update to its chat partition
+        """
+        await self.redis_client.redis_client.xadd(
+            self.key(self.partition(update)),
+            {"update": json.dumps(update.to_dict())},
+            maxlen=Config.STREAM_MAXLEN,
+            approximate=True,
+        )
+
+    async def create_groups(self, partitions: list[int]) -> None:
+        for partition in partitions:
+            try:
+                await self.redis_client.redis_client.xgroup_create(
+                    self.key(partition), self.group, id="0", mkstream=True
+                )
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def read(
+        self, consumer: str, partitions: list[int], pending: bool, block: int
+    ) -> list[tuple[str, str, dict]]:
+        """
+        Read entries for consumer, either own unacknowledged or new ones
+        """
+        streams = {self.key(p): "0" if pending else ">" for p in partitions}
+        response = await self.redis_client.redis_client.xreadgroup(
+            self.group, consumer, streams, count=Config.STREAM_BATCH, block=block
+        )
+        return [
+            (stream, entry_id, json.loads(fields["update"]))
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def ack(self, stream: str, entry_id: str) -> None:
+        await self.redis_client.redis_client.xack(stream, self.group, entry_id)
+
+
+def create_ingress_application(update_stream: UpdateStream) -> Application:
+    """Application that only receives updates and pushes them to Redis."""
+
+    async def publish(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        await update_stream.publish(update)
+
+    application = Application.builder().token(Config.BOT_TOKEN).build()
+    application.add_handler(TypeHandler(Update, publish))
+    return application
+
+
+async def run_worker(
+    application: Application,
+    update_stream: UpdateStream,
+    worker_id: int = Config.WORKER_ID,
+    workers: int = Config.WORKERS,
+    stop_event: Optional[asyncio.Event] = None,
+) -> None:
+    """
+    Consume updates of this worker's partitions and process them with application
+    """
+    partitions = update_stream.worker_partitions(worker_id, workers)
+    consumer = f"worker-{worker_id}"
+    logger.info(f"Worker {worker_id} consumes partitions {partitions}")
+    await update_stream.create_groups(partitions)
+    stop_event = stop_event or asyncio.Event()
+    in_flight: set[asyncio.Task] = set()
+    limit = application.update_processor.max_concurrent_updates * 2
+
+    async def handle(stream: str, entry_id: str, data: dict) -> None:
+        update = Update.de_json(data, application.bot)
+        try:
+            await application.update_processor.process_update(
+                update, application.process_update(update)
+            )
+        except Exception as e:
+            logger.error(f"Error processing update {update.update_id}: {e}")
+        await update_stream.ack(stream, entry_id)
+
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            # Entries delivered before a restart but never acknowledged come first
+            pending = True
+            try:
+                while not stop_event.is_set():
+                    entries = await update_stream.read(
+                        consumer, partitions, pending, Config.STREAM_BLOCK_MS
+                    )
+                    if pending and not entries:
+                        pending = False
+                        continue
+                    for stream, entry_id, data in entries:
+                        while len(in_flight) >= limit:
+                            _, in_flight = await asyncio.wait(
+                                in_flight, return_when=asyncio.FIRST_COMPLETED
+                            )
+                        task = asyncio.create_task(handle(stream, entry_id, data))
+                        in_flight.add(task)
+                    if pending:
+                        # Pending entries are re-read from the start until acked
+                        await asyncio.gather(*in_flight)
+                        in_flight.clear()
+            finally:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+                await application.stop()
+    finally:
+        # After shutdown so persistence is flushed before clients are closed
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def run_jobs(
+    application: Application, stop_event: Optional[asyncio.Event] = None
+) -> None:
+    """
+    Only process background jobs, their workers are started by post_init
+    """
+    stop_event = stop_event or asyncio.Event()
+    try:
+        async with application:
+            if application.post_init:
+                await application.post_init(application)
+            await stop_event.wait()
+    finally:
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,192 @@
+import asyncio
+
+from types import SimpleNamespace
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+        self.photos = []
+        self.deleted = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+        return SimpleNamespace(message_id=len(self.sent))
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.photos.append((chat_id, photo))
+        file_id = photo if isinstance(photo, str) else f"file-{len(self.photos)}"
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.edits.append((chat_id, message_id, text))
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        self.deleted.append((chat_id, message_id))
+
+
+class FakePipeline:
+    def __init__(self, server):
+        self.server = server
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    async def execute(self):
+        self.server.executed += 1
+        return [await getattr(self.server, n)(*a, **k) for n, a, k in self.commands]
+
+
+class FakeRedisServer:
+    """In-memory subset of redis.asyncio.Redis commands."""
+
+    def __init__(self):
+        self.data = {}
+        self.executed = 0
+        # stream -> entries, (stream, group) -> {entry id: consumer}
+        self.streams = {}
+        self.groups = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        fields = {field: value} if mapping is None else mapping
+        self.data.setdefault(key, {}).update({k: str(v) for k, v in fields.items()})
+
+    async def expire(self, key, seconds):
+        pass
+
+    async def rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+
+    async def ltrim(self, key, start, end):
+        values = self.data.get(key, [])
+        self.data[key] = values[start : None if end == -1 else end + 1]
+
+    async def lrange(self, key, start, end):
+        return self.data.get(key, [])[start : None if end == -1 else end + 1]
+
+    async def hdel(self, key, field):
+        self.data.get(key, {}).pop(field, None)
+
+    async def zadd(self, key, mapping):
+        self.data.setdefault(key, {}).update(mapping)
+
+    async def zremrangebyscore(self, key, low, high):
+        zset = self.data.get(key, {})
+        for member in [m for m, score in zset.items() if low <= score <= high]:
+            del zset[member]
+
+    async def zrank(self, key, member):
+        ranked = sorted(self.data.get(key, {}).items(), key=lambda item: item[1])
+        members = [m for m, _ in ranked]
+        return members.index(member) if member in members else None
+
+    async def zrem(self, key, member):
+        self.data.get(key, {}).pop(member, None)
+
+    async def zcard(self, key):
+        return len(self.data.get(key, {}))
+
+    async def zpopmin(self, key, count):
+        zset = self.data.get(key, {})
+        popped = sorted(zset.items(), key=lambda item: item[1])[:count]
+        for member, _ in popped:
+            del zset[member]
+        return popped
+
+    async def xadd(self, stream, fields, **kwargs):
+        entries = self.streams.setdefault(stream, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id, fields))
+        return entry_id
+
+    async def xgroup_create(self, stream, group, id="0", mkstream=False):
+        self.streams.setdefault(stream, [])
+        self.groups.setdefault((stream, group), {})
+
+    async def xreadgroup(self, group, consumer, streams, count=None, block=None):
+        response = []
+        for stream, position in streams.items():
+            pending = self.groups[(stream, group)]
+            if position == "0":
+                ids = [i for i, c in pending.items() if c == consumer]
+                entries = [e for e in self.streams[stream] if e[0] in ids]
+            else:
+                delivered = self.groups.setdefault((stream, group, "delivered"), set())
+                entries = [e for e in self.streams[stream] if e[0] not in delivered]
+                entries = entries[:count]
+                for entry_id, _ in entries:
+                    delivered.add(entry_id)
+                    pending[entry_id] = consumer
+            if entries:
+                response.append((stream, entries))
+        if not response and block:
+            await asyncio.sleep(0.01)
+        return response
+
+    async def xautoclaim(self, stream, group, consumer, min_idle, count=None):
+        return "0-0", [], []
+
+    async def xack(self, stream, group, entry_id):
+        self.groups[(stream, group)].pop(entry_id, None)
+
+
+class FakeRedis:
+    """In-memory stand-in for AsyncRedisClient."""
+
+    def __init__(self):
+        self.redis_client = FakeRedisServer()
+        self.data = self.redis_client.data
+        self.reads = []
+        # Raised by (or, if not asked to raise, hidden in) get_value
+        self.error = None
+
+    async def get_value(self, key, default=None, raise_errors=False):
+        self.reads.append(key)
+        if self.error is not None:
+            if raise_errors:
+                raise self.error
+            return default
+        return self.data.get(key, default)
+
+    async def set_value(self, key, value, expire_seconds=None):
+        self.data[key] = value
+        return True
+
+    async def delete_value(self, key):
+        return self.data.pop(key, None) is not None
+
+    async def get_list(self, key, start=0, end=-1):
+        values = self.data.get(key, [])
+        end = len(values) if end == -1 else end + 1
+        return values[start:end]
+
+    async def push_values(self, key, values, max_len=None, expire_seconds=None):
+        items = self.data.setdefault(key, [])
+        items.extend(values)
+        if max_len:
+            del items[:-max_len]
+        return True
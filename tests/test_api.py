@@ -0,0 +1,392 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mltoolsbot import api, main_bot_v2
+from mltoolsbot.cache import ResponseCache
+from mltoolsbot.config import Config
+from mltoolsbot.history import ConversationHistory
+from mltoolsbot.jobs import JobQueue, run_job_workers
+from mltoolsbot.providers import ClaudeProvider, Provider, ProviderRegistry
+from mltoolsbot.scheduler import AdmissionController
+from tests.fakes import FakeBot, FakeRedis
+
+BACKEND_DELAY = 0.2
+CONVERSATIONS = 10
+
+
+def make_request(bot, user_id):
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=int(user_id)))
+    context = SimpleNamespace(bot=bot, user_data={})
+    return update, context
+
+
+class SlowMessages:
+    """
+    Stands in for messages.create of the anthropic client
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    async def create(self, model, system, messages, **params):
+        self.calls.append(messages)
+        await asyncio.sleep(BACKEND_DELAY)
+        text = f"answer {len(messages)}"
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+class FakeYandexArt(Provider):
+    name = Config.YDX_ART
+    kind = "image"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def _generate_image(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        return b"png"
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    redis = FakeRedis()
+    for user_id in range(CONVERSATIONS):
+        redis.data[str(user_id)] = {"login": "user"}
+    registry = ProviderRegistry()
+    monkeypatch.setattr(Config, "ANTHROPIC_TOKEN", "token")
+    claude = ClaudeProvider()
+    messages = SlowMessages()
+    monkeypatch.setattr(claude.client.messages, "create", messages.create)
+    backend = SimpleNamespace(
+        redis=redis, claude=claude, messages=messages, art=FakeYandexArt()
+    )
+    registry.register(backend.claude)
+    registry.register(backend.art)
+    monkeypatch.setattr(api, "redis_client", redis)
+    monkeypatch.setattr(api, "providers", registry)
+    monkeypatch.setattr(
+        api, "histories", {Config.CLAUDE: ConversationHistory(redis, "claude")}
+    )
+    monkeypatch.setattr(api, "text_cache", ResponseCache(redis, "text"))
+    monkeypatch.setattr(api, "image_cache", ResponseCache(redis, "image"))
+    monkeypatch.setattr(api, "image_jobs", JobQueue(redis))
+    limits = {backend: CONVERSATIONS for backend in Config.BACKEND_CONCURRENCY}
+    monkeypatch.setattr(api, "admission", AdmissionController(backend_limits=limits))
+    monkeypatch.setattr(Config, "STREAMING", False)
+    monkeypatch.setattr(Config, "IMAGE_JOBS", False)
+    api.auth_cache.clear()
+    yield backend
+    api.auth_cache.clear()
+
+
+class TestClaudeConcurrency:
+    # Concurrent Claude conversations share one client and do not queue
+    # behind each other.
+    @pytest.mark.asyncio
+    async def test_concurrent_conversations(self, fake_backend):
+        bot = FakeBot()
+        client = fake_backend.claude.client
+
+        async def converse(user_id):
+            update, context = make_request(bot, user_id)
+            await api.call_api(
+                update,
+                context,
+                user_id=str(user_id),
+                text="Hello",
+                command=Config.CLAUDE_LLM,
+            )
+
+        start = time.perf_counter()
+        await asyncio.gather(*(converse(i) for i in range(CONVERSATIONS)))
+        elapsed = time.perf_counter() - start
+
+        assert len(bot.sent) == CONVERSATIONS
+        assert all(text == "answer 1" for _, text in bot.sent)
+        assert len(fake_backend.messages.calls) == CONVERSATIONS
+        assert elapsed < BACKEND_DELAY * 2
+        assert fake_backend.claude.client is client
+        assert client.max_retries == 0
+
+
+class TestCheckAuth:
+    # Repeat requests are authorized without touching Redis.
+    @pytest.mark.asyncio
+    async def test_repeat_user_served_from_cache(self, fake_backend):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        hits = api.auth_cache.hits
+        for _ in range(3):
+            await api.call_api(
+                update, context, user_id="1", text="Hi", command=Config.SUMMARIZE
+            )
+        assert fake_backend.redis.reads.count("1") == 1
+        # Authorization and fair queuing weight of every request but the first
+        assert api.auth_cache.hits - hits == 5
+
+    # Unknown users are cached as unauthorized until invalidated.
+    @pytest.mark.asyncio
+    async def test_negative_cache_and_invalidation(self, fake_backend):
+        bot = FakeBot()
+        update, context = make_request(bot, "100")
+        await api.call_api(
+            update, context, user_id="100", text="Hi", command=Config.SUMMARIZE
+        )
+        await api.call_api(
+            update, context, user_id="100", text="Hi", command=Config.SUMMARIZE
+        )
+        assert fake_backend.redis.reads.count("100") == 1
+        assert bot.sent[-1][1] == "To use this service you should be logged in"
+
+        fake_backend.redis.data["100"] = {"login": "user"}
+        api.invalidate_auth("100")
+        await api.call_api(
+            update, context, user_id="100", text="Hi", command=Config.SUMMARIZE
+        )
+        assert bot.sent[-1][1] == "answer 1"
+
+    # A Redis error is reported and not cached as an unauthorized user.
+    @pytest.mark.asyncio
+    async def test_redis_error_not_cached(self, fake_backend):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        fake_backend.redis.error = ConnectionError("redis down")
+        await api.call_api(
+            update, context, user_id="1", text="Hi", command=Config.SUMMARIZE
+        )
+        assert bot.sent[-1][1] == "Sorry, service is temporarily unavailable"
+
+        fake_backend.redis.error = None
+        await api.call_api(
+            update, context, user_id="1", text="Hi", command=Config.SUMMARIZE
+        )
+        assert bot.sent[-1][1] == "answer 1"
+
+
+class TestAdmission:
+    # Unauthorized users are rejected before they take rate or queue capacity.
+    @pytest.mark.asyncio
+    async def test_unauthorized_not_admitted(self, fake_backend):
+        bot = FakeBot()
+
+        async def reply_text(text, **kwargs):
+            bot.sent.append((100, text))
+            return SimpleNamespace(message_id=len(bot.sent))
+
+        update = SimpleNamespace(
+            effective_chat=SimpleNamespace(id=100),
+            message=SimpleNamespace(
+                text="Hi", from_user=SimpleNamespace(id=100), reply_text=reply_text
+            ),
+        )
+        for _ in range(int(Config.USER_RATE_LIMIT) + 1):
+            context = SimpleNamespace(bot=bot, user_data={"command": Config.SUMMARIZE})
+            await main_bot_v2.proceed_command(update, context)
+
+        assert api.admission.users.get("100") is None
+        assert bot.sent[-1] == (100, "To use this service you should be logged in")
+
+
+class TestClaudeResponseCache:
+    # Repeated summarize requests are answered without calling the API.
+    @pytest.mark.asyncio
+    async def test_summarize_is_cached(self, fake_backend):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        for command in (Config.SUMMARIZE, Config.SUMMARIZE, Config.TRANSLATE):
+            await api.call_api(
+                update, context, user_id="1", text="Long text", command=command
+            )
+        assert len(fake_backend.messages.calls) == 2
+        assert [text for _, text in bot.sent] == ["answer 1"] * 3
+        assert api.text_cache.stats()["local_hits"] == 1
+
+
+class TestImageCache:
+    # Repeated prompts are served by file_id without generation or upload.
+    @pytest.mark.asyncio
+    async def test_repeated_prompt_reuses_file_id(self, fake_backend):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        for text in ("cat", "cat", "dog"):
+            await api.call_api(
+                update, context, user_id="1", text=text, command=Config.TEXT2IMG
+            )
+
+        assert fake_backend.art.prompts == ["cat", "dog"]
+        assert bot.photos[1] == (1, "file-1")
+
+    # Images uploaded with other encoding settings are generated again.
+    @pytest.mark.asyncio
+    async def test_encoding_settings_in_key(self, fake_backend, monkeypatch):
+        bot = FakeBot()
+        await api.answer_image(bot, 1, "cat", fake_backend.art)
+        monkeypatch.setattr(Config, "IMAGE_QUALITY", 50)
+        await api.answer_image(bot, 1, "cat", fake_backend.art)
+
+        assert fake_backend.art.prompts == ["cat", "cat"]
+
+
+class TestImageJobs:
+    # Image requests are acknowledged at once and delivered by a job worker.
+    @pytest.mark.asyncio
+    async def test_job_delivers_photo(self, fake_backend, monkeypatch):
+        monkeypatch.setattr(Config, "IMAGE_JOBS", True)
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        await api.call_api(
+            update, context, user_id="1", text="cat", command=Config.TEXT2IMG
+        )
+        assert "/job" in bot.sent[-1][1] and bot.photos == []
+        [job] = await api.image_jobs.user_jobs("1")
+        assert job["status"] == "queued" and job["position"] == 1
+
+        stop_event = asyncio.Event()
+        workers = asyncio.create_task(
+            run_job_workers(
+                api.image_jobs,
+                lambda job: api.process_image_job(bot, job),
+                consumer="test",
+                concurrency=2,
+                stop_event=stop_event,
+            )
+        )
+        while (await api.image_jobs.get(job["id"]))["status"] != "done":
+            await asyncio.sleep(0.01)
+        stop_event.set()
+        await workers
+
+        assert len(bot.photos) == 1
+        assert (await api.image_jobs.get(job["id"]))["file_id"] == "file-1"
+
+    # A user queueing many jobs does not hold back the job of another user.
+    @pytest.mark.asyncio
+    async def test_jobs_are_admitted_fairly(self, fake_backend, monkeypatch):
+        monkeypatch.setattr(
+            api, "admission", AdmissionController(backend_limits={Config.YDX_ART: 1})
+        )
+        bot = FakeBot()
+        prompts = [("1", f"cat {i}") for i in range(4)] + [("2", "dog")]
+        for user_id, prompt in prompts:
+            await api.image_jobs.submit(
+                user_id,
+                chat_id=int(user_id),
+                command=Config.TEXT2IMG,
+                backend=Config.YDX_ART,
+                prompt=prompt,
+            )
+
+        stop_event = asyncio.Event()
+        workers = asyncio.create_task(
+            run_job_workers(
+                api.image_jobs,
+                lambda job: api.process_image_job(bot, job),
+                consumer="test",
+                concurrency=len(prompts),
+                stop_event=stop_event,
+            )
+        )
+        while len(bot.photos) < len(prompts):
+            await asyncio.sleep(0.01)
+        stop_event.set()
+        await workers
+
+        assert fake_backend.art.prompts[:2] == ["cat 0", "dog"]
+
+
+class TestSingleFlight:
+    # Identical concurrent summarize requests share one backend call.
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_requests(self, fake_backend):
+        bot = FakeBot()
+
+        async def summarize(user_id):
+            update, context = make_request(bot, user_id)
+            await api.call_api(
+                update,
+                context,
+                user_id=user_id,
+                text="Same text",
+                command=Config.SUMMARIZE,
+            )
+
+        await asyncio.gather(*(summarize(str(i)) for i in range(5)))
+        assert len(fake_backend.messages.calls) == 1
+        assert sorted(bot.sent) == [(i, "answer 1") for i in range(5)]
+
+    # Failing to deliver to the first caller's chat does not fail the others.
+    @pytest.mark.asyncio
+    async def test_delivery_is_per_caller(self, fake_backend):
+        class BlockedBot(FakeBot):
+            async def send_photo(self, chat_id, photo, **kwargs):
+                if chat_id == 0:
+                    raise RuntimeError("bot was blocked by the user")
+                return await super().send_photo(chat_id, photo, **kwargs)
+
+        bot = BlockedBot()
+        results = await asyncio.gather(
+            *(api.answer_image(bot, i, "cat", fake_backend.art) for i in range(3)),
+            return_exceptions=True,
+        )
+
+        assert fake_backend.art.prompts == ["cat"]
+        assert isinstance(results[0], RuntimeError)
+        assert sorted(chat_id for chat_id, _ in bot.photos) == [1, 2]
+
+
+class TestProviderDispatch:
+    # Conversation commands keep history, failures are reported to the user.
+    @pytest.mark.asyncio
+    async def test_conversation_and_errors(self, fake_backend, monkeypatch):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        for _ in range(2):
+            await api.call_api(
+                update, context, user_id="1", text="Hi", command=Config.CLAUDE_LLM
+            )
+        assert [text for _, text in bot.sent] == ["answer 1", "answer 3"]
+
+        async def failing(system, messages):
+            raise RuntimeError("backend down")
+
+        monkeypatch.setattr(fake_backend.claude, "_generate_text", failing)
+        await api.call_api(
+            update, context, user_id="1", text="Hi", command=Config.CLAUDE_LLM
+        )
+        assert bot.sent[-1][1] == "Sorry, something went wrong"
+
+    # An empty streamed response is not kept in the conversation.
+    @pytest.mark.asyncio
+    async def test_empty_stream_not_saved(self, fake_backend, monkeypatch):
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+
+        async def empty(system, messages):
+            yield ""
+
+        monkeypatch.setattr(Config, "STREAMING", True)
+        monkeypatch.setattr(fake_backend.claude, "_stream_text", empty)
+        await api.call_api(
+            update, context, user_id="1", text="Hi", command=Config.CLAUDE_LLM
+        )
+        assert bot.sent == []
+        assert await api.histories[Config.CLAUDE].load("1") == []
+
+
+class TestDeadline:
+    # A backend exceeding its deadline is cancelled and the user is told.
+    @pytest.mark.asyncio
+    async def test_backend_timeout_is_reported(self, fake_backend, monkeypatch):
+        monkeypatch.setitem(Config.BACKEND_TIMEOUTS, Config.CLAUDE, 0.05)
+        bot = FakeBot()
+        update, context = make_request(bot, "1")
+        start = time.perf_counter()
+        await api.call_api(
+            update, context, user_id="1", text="Hi", command=Config.CLAUDE_LLM
+        )
+        assert time.perf_counter() - start < BACKEND_DELAY
+        assert bot.sent == [(1, "Sorry, timeout error")]
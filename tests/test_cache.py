@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+from mltoolsbot.cache import ResponseCache, TTLCache
+from tests.fakes import FakeRedis
+
+
+class TestTTLCache:
+    # Least recently used entry is evicted when cache is full.
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert "a" in cache and "c" in cache
+        assert "b" not in cache
+
+    # Expired entries are reported as misses.
+    def test_expiration_and_counters(self, monkeypatch):
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now)
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2, ttl=1)
+        assert cache.get("a") == 1
+        monkeypatch.setattr(time, "monotonic", lambda: now + 2)
+        assert cache.get("b") is None
+        assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def make_response_cache(**kwargs):
+    redis = FakeRedis()
+    return ResponseCache(redis, "test", **kwargs), redis
+
+
+class TestResponseCache:
+    # Values are served from the local tier, then from Redis.
+    @pytest.mark.asyncio
+    async def test_two_tiers(self):
+        cache, redis = make_response_cache(local_size=1)
+        key = cache.make_key("model", "system", "text")
+        assert await cache.get(key) is None
+        await cache.set(key, "42")
+        assert await cache.get(key) == "42"
+        await cache.set(cache.make_key("other"), "value")
+        assert await cache.get(key) == "42"
+        assert cache.stats() == {
+            "local_hits": 1,
+            "redis_hits": 1,
+            "misses": 1,
+            "hit_rate": 2 / 3,
+        }
+
+    # Oldest Redis entries are evicted above max_entries.
+    @pytest.mark.asyncio
+    async def test_size_bounded_eviction(self):
+        cache, redis = make_response_cache(max_entries=2)
+        for i in range(4):
+            await cache.set(cache.make_key(i), str(i))
+        stored = [k for k in redis.data if k.startswith("test-cache:")]
+        assert sorted(stored) == sorted(
+            f"test-cache:{cache.make_key(i)}" for i in (2, 3)
+        )
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from mltoolsbot import deadline
+from mltoolsbot.config import Config
+from mltoolsbot.exceptions import TimeoutError
+from mltoolsbot.providers import Provider
+
+
+class SlowProvider(Provider):
+    name = Config.OLLAMA
+
+    async def _generate_text(self, system, messages):
+        await asyncio.sleep(10)
+
+    async def _stream_text(self, system, messages):
+        for text in ("a", "ab"):
+            yield text
+        await asyncio.sleep(10)
+
+
+class TestDeadline:
+    # A nested budget can only shorten the update's deadline.
+    @pytest.mark.asyncio
+    async def test_budget_is_shortened_only(self):
+        assert deadline.remaining() is None
+        with deadline.budget(1):
+            with deadline.budget(10):
+                assert deadline.remaining() <= 1
+            with deadline.budget(0.5):
+                assert deadline.remaining() <= 0.5
+        assert deadline.remaining() is None
+
+    # Timeouts fire at the update deadline even if the own timeout is longer.
+    @pytest.mark.asyncio
+    async def test_timeout_bounded_by_budget(self):
+        start = time.perf_counter()
+        with deadline.budget(0.1):
+            with pytest.raises(TimeoutError):
+                async with deadline.timeout(10, "sleep"):
+                    await asyncio.sleep(1)
+            await asyncio.sleep(0.1)
+            # Nothing is started once the budget is spent
+            with pytest.raises(TimeoutError):
+                async with deadline.timeout(10, "sleep"):
+                    pass
+        assert time.perf_counter() - start < 0.5
+
+
+class TestProviderDeadline:
+    # Hung backends are cancelled after their configured timeout.
+    @pytest.mark.asyncio
+    async def test_backend_timeout(self, monkeypatch):
+        monkeypatch.setitem(Config.BACKEND_TIMEOUTS, Config.OLLAMA, 0.1)
+        provider = SlowProvider()
+        with pytest.raises(TimeoutError):
+            await provider.generate_text("", [{"role": "user", "content": "Hi"}])
+
+        chunks = []
+        with pytest.raises(TimeoutError):
+            async for text in provider.stream_text("", []):
+                chunks.append(text)
+        assert chunks == ["a", "ab"]
+
+    # Calls cut short by the update's deadline do not open the circuit,
+    # only timeouts of the backend's own window count as failures.
+    @pytest.mark.asyncio
+    async def test_update_deadline_is_not_backend_failure(self, monkeypatch):
+        monkeypatch.setitem(Config.BACKEND_TIMEOUTS, Config.OLLAMA, 0.05)
+        provider = SlowProvider()
+        provider.breaker.failure_threshold = 2
+        messages = [{"role": "user", "content": "Hi"}]
+        for budget in (0, 0, 0, 0, 0, 0.01, 0.01):
+            with deadline.budget(budget), pytest.raises(TimeoutError):
+                await provider.generate_text("", messages)
+        assert provider.breaker.state == "closed"
+
+        for _ in range(2):
+            with deadline.budget(1), pytest.raises(TimeoutError):
+                await provider.generate_text("", messages)
+        assert provider.breaker.state == "open"
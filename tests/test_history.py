@@ -0,0 +1,42 @@
+import pytest
+
+from mltoolsbot.history import ConversationHistory
+from tests.fakes import FakeRedis
+
+
+def turn(i, size=4):
+    return (
+        {"role": "user", "content": f"q{i}".ljust(size)},
+        {"role": "assistant", "content": f"a{i}".ljust(size)},
+    )
+
+
+class TestConversationHistory:
+    # Only last max_turns turns are kept in storage.
+    @pytest.mark.asyncio
+    async def test_turn_window(self):
+        redis = FakeRedis()
+        history = ConversationHistory(redis, "test", max_turns=3, max_tokens=1000)
+        for i in range(5):
+            await history.append("1", *turn(i))
+        messages = await history.load("1")
+        assert [m["content"].strip() for m in messages] == [
+            "q2",
+            "a2",
+            "q3",
+            "a3",
+            "q4",
+            "a4",
+        ]
+        assert len(redis.data[history.key("1")]) == 6
+
+    # Oldest turns are dropped to fit token budget, keeping user message first.
+    @pytest.mark.asyncio
+    async def test_token_window(self):
+        redis = FakeRedis()
+        history = ConversationHistory(redis, "test", max_turns=10, max_tokens=60)
+        for i in range(5):
+            await history.append("1", *turn(i, size=40))
+        messages = await history.load("1")
+        assert len(messages) == 4
+        assert messages[0] == turn(3, size=40)[0]
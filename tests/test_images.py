@@ -0,0 +1,106 @@
+import asyncio
+import base64
+import io
+import json
+import os
+import time
+import tracemalloc
+
+import pytest
+
+from mltoolsbot import images
+from mltoolsbot.config import Config
+from mltoolsbot.images import ImageDecoder, compress_image
+
+IMAGE_SIZE = 4 * 1024 * 1024
+
+
+def txt2img_body(*images):
+    encoded = ", ".join(f'"{base64.b64encode(image).decode()}"' for image in images)
+    return f'{{"images": [{encoded}], "parameters": {{}}, "info": "{{}}"}}'.encode()
+
+
+def chunks(body, size):
+    view = memoryview(body)
+    for start in range(0, len(body), size):
+        yield bytes(view[start : start + size])
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestImageDecoder:
+    # Images are decoded whatever the chunk boundaries are.
+    def test_chunk_boundaries(self):
+        images = [os.urandom(1000), os.urandom(7), b""]
+        body = txt2img_body(*images)
+        for size in (1, 3, 5, 64, len(body)):
+            decoder = ImageDecoder()
+            for chunk in chunks(body, size):
+                decoder.feed(chunk)
+            assert decoder.images == images
+
+    # Peak memory per image stays close to the image size, instead of
+    # several copies of the response and its base64 text.
+    def test_peak_memory(self):
+        image = os.urandom(IMAGE_SIZE)
+        body = txt2img_body(image)
+
+        def parse_json():
+            decoded = base64.b64decode(json.loads(body)["images"][0])
+            assert decoded == image
+
+        def stream():
+            decoder = ImageDecoder()
+            for chunk in chunks(body, 64 * 1024):
+                decoder.feed(chunk)
+            assert decoder.images[0] == image
+
+        json_peak = peak_memory(parse_json)
+        stream_peak = peak_memory(stream)
+        assert stream_peak < 1.5 * IMAGE_SIZE
+        assert stream_peak < json_peak / 2
+
+
+class TestCompressImage:
+    # Without an output format or Pillow the generated image is kept.
+    @pytest.mark.asyncio
+    async def test_disabled(self, monkeypatch):
+        assert await compress_image(b"png") == b"png"
+        monkeypatch.setattr(Config, "IMAGE_FORMAT", "jpeg")
+        monkeypatch.setattr(images, "pillow_available", lambda: False)
+        assert await compress_image(b"png") == b"png"
+
+    # Uploading the re-encoded image over a slow link takes less time in
+    # total than uploading the generated PNG.
+    @pytest.mark.asyncio
+    async def test_upload_latency(self, monkeypatch):
+        image_module = pytest.importorskip("PIL.Image")
+        monkeypatch.setattr(Config, "IMAGE_FORMAT", "jpeg")
+        monkeypatch.setattr(Config, "IMAGE_MAX_SIZE", 512)
+        noise = image_module.frombytes("RGB", (1024, 1024), os.urandom(3 * 1024**2))
+        output = io.BytesIO()
+        noise.save(output, format="PNG")
+        png = output.getvalue()
+        # 64 Mbit/s uplink
+        bandwidth = 8 * 1024**2
+
+        async def upload(image):
+            start = time.perf_counter()
+            image = await compress_image(image)
+            await asyncio.sleep(len(image) / bandwidth)
+            return time.perf_counter() - start
+
+        # Start the worker processes outside the measurement
+        await compress_image(png)
+        compressed = await upload(png)
+        monkeypatch.setattr(Config, "IMAGE_FORMAT", "")
+        original = await upload(png)
+        images.shutdown_pool()
+        assert compressed < original / 2
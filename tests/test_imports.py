@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+from loguru import logger
+
+LAZY_MODULES = ["anthropic", "yandex_cloud_ml_sdk"]
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds by module, from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+class TestImportTime:
+    # Backend SDKs are not imported until a provider is used.
+    def test_api_import_skips_backend_sdks(self):
+        times = import_times("mltoolsbot.api")
+        logger.info(f"mltoolsbot.api import: {times['mltoolsbot.api'] / 1000:.0f} ms")
+        assert not [m for m in LAZY_MODULES if m in times]
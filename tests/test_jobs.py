@@ -0,0 +1,107 @@
+import asyncio
+
+import pytest
+
+from mltoolsbot.jobs import JobQueue, run_job_workers
+from tests.fakes import FakeRedis
+
+
+real_sleep = asyncio.sleep
+
+
+async def fast_sleep(delay, *args):
+    await real_sleep(min(delay, 0.01), *args)
+
+
+class FlakyJobQueue(JobQueue):
+    """Fails the first call of setup and claim like a Redis outage."""
+
+    def __init__(self, redis_client):
+        super().__init__(redis_client)
+        self.failed = []
+
+    def fail_once(self, name):
+        if name not in self.failed:
+            self.failed.append(name)
+            raise ConnectionError("redis blip")
+
+    async def create_group(self):
+        self.fail_once("create_group")
+        await super().create_group()
+
+    async def claim(self, consumer, min_idle, count):
+        self.fail_once("claim")
+        return await super().claim(consumer, min_idle, count)
+
+
+async def run_until(queue, handler, done, consumer="test"):
+    stop_event = asyncio.Event()
+    workers = asyncio.create_task(
+        run_job_workers(
+            queue, handler, consumer=consumer, concurrency=2, stop_event=stop_event
+        )
+    )
+    while not await done():
+        await asyncio.sleep(0.01)
+    stop_event.set()
+    await workers
+
+
+class TestJobQueue:
+    # Queued jobs report their position, results and errors are stored.
+    @pytest.mark.asyncio
+    async def test_status_and_results(self):
+        queue = JobQueue(FakeRedis())
+        first = await queue.submit("1", prompt="cat")
+        second = await queue.submit("1", prompt="fail")
+        assert (await queue.get(second))["position"] == 2
+
+        async def handler(job):
+            if job["prompt"] == "fail":
+                raise RuntimeError("backend down")
+            return {"file_id": "file-1"}
+
+        async def finished():
+            jobs = await queue.user_jobs("1")
+            return all(job["status"] in ("done", "failed") for job in jobs)
+
+        await run_until(queue, handler, finished)
+        jobs = {job["id"]: job for job in await queue.user_jobs("1")}
+        assert jobs[first]["status"] == "done"
+        assert jobs[first]["file_id"] == "file-1"
+        assert jobs[second]["status"] == "failed"
+        assert jobs[second]["error"] == "backend down"
+
+    # Jobs a consumer never acknowledged are resumed when it restarts.
+    @pytest.mark.asyncio
+    async def test_unacknowledged_job_resumed(self):
+        queue = JobQueue(FakeRedis())
+        await queue.create_group()
+        job_id = await queue.submit("1", prompt="cat")
+        assert await queue.read("test", count=1) == [("1-0", job_id)]
+        handled = []
+
+        async def handler(job):
+            handled.append(job["id"])
+
+        async def finished():
+            return (await queue.get(job_id))["status"] == "done"
+
+        await run_until(queue, handler, finished)
+        assert handled == [job_id]
+
+    # Redis errors while setting up or claiming jobs are retried.
+    @pytest.mark.asyncio
+    async def test_redis_errors_are_retried(self, monkeypatch):
+        monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+        queue = FlakyJobQueue(FakeRedis())
+        job_id = await queue.submit("1", prompt="cat")
+
+        async def finished():
+            return (await queue.get(job_id))["status"] == "done"
+
+        async def handler(job):
+            return {"file_id": "file-1"}
+
+        await run_until(queue, handler, finished)
+        assert queue.failed == ["create_group", "claim"]
@@ -0,0 +1,48 @@
+import asyncio
+import socket
+
+import pytest
+from prometheus_client import generate_latest
+
+from mltoolsbot import metrics
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestMetrics:
+    # Labelled samples are exported with the configured buckets.
+    def test_export(self):
+        metrics.BACKEND_ERRORS.labels(backend="sd", error="timeout").inc()
+        metrics.QUEUE_WAIT_SECONDS.labels(backend="sd", kind="image").observe(7)
+
+        lines = generate_latest().decode().splitlines()
+        assert any(
+            line.startswith('bot_backend_errors_total{backend="sd",error="timeout"}')
+            for line in lines
+        )
+        assert any(
+            line.startswith(
+                'bot_queue_wait_seconds_bucket{backend="sd",kind="image",le="10.0"}'
+            )
+            for line in lines
+        )
+
+    # Metrics are served over HTTP on /metrics until the server is stopped.
+    @pytest.mark.asyncio
+    async def test_server(self):
+        port = free_port()
+        stop = metrics.start_server("127.0.0.1", port)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            response = (await reader.read()).decode()
+            writer.close()
+        finally:
+            await asyncio.to_thread(stop)
+        assert response.startswith("HTTP/1.0 200 OK")
+        assert "bot_requests_total" in response
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from mltoolsbot.persistence import RedisPersistence
+from mltoolsbot.resilience import RetryPolicy
+from tests.fakes import FakePipeline, FakeRedisServer
+
+
+def make_persistence(redis):
+    return RedisPersistence(SimpleNamespace(redis_client=redis), prefix="test")
+
+
+class FlakyRedisServer(FakeRedisServer):
+    """Redis failing the first pipelines."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def pipeline(self, transaction=True):
+        pipe = FakePipeline(self)
+        if self.failures:
+            self.failures -= 1
+            pipe.execute = self.fail
+        return pipe
+
+    async def fail(self):
+        raise ConnectionError("Redis is down")
+
+
+class TestRedisPersistence:
+    # Changes handed over in one persistence run are written in one pipeline.
+    @pytest.mark.asyncio
+    async def test_batched_write_behind(self):
+        redis = FakeRedisServer()
+        persistence = make_persistence(redis)
+        await asyncio.gather(
+            persistence.update_conversation("main", (1, 1), "\x03"),
+            persistence.update_conversation("main", (2, 2), "\x01"),
+            persistence.update_user_data(1, {"command": "\x05"}),
+            persistence.update_bot_data({}),
+        )
+        await persistence.flush()
+        assert redis.executed == 1
+        assert len(redis.data["test:conversations:main"]) == 2
+
+    # State survives a restart of the bot.
+    @pytest.mark.asyncio
+    async def test_state_survives_restart(self):
+        redis = FakeRedisServer()
+        persistence = make_persistence(redis)
+        await persistence.update_conversation("main", (1, 1), "\x03")
+        await persistence.update_conversation("main", (2, 2), "\x01")
+        await persistence.update_user_data(1, {"command": "\x05"})
+        await persistence.flush()
+        await persistence.update_conversation("main", (2, 2), None)
+        await persistence.flush()
+
+        restarted = make_persistence(redis)
+        assert await restarted.get_conversations("main") == {(1, 1): "\x03"}
+        assert await restarted.get_user_data() == {1: {"command": "\x05"}}
+        assert await restarted.get_chat_data() == {}
+
+    # A failed write is retried without waiting for the next update.
+    @pytest.mark.asyncio
+    async def test_failed_write_is_retried(self):
+        redis = FlakyRedisServer(failures=2)
+        persistence = make_persistence(redis)
+        persistence.retry = RetryPolicy(attempts=3, base_delay=0.01, max_delay=0.01)
+        await persistence.update_user_data(1, {"command": "\x05"})
+        await asyncio.sleep(0.1)
+        assert redis.failures == 0
+        restarted = make_persistence(redis)
+        assert await restarted.get_user_data() == {1: {"command": "\x05"}}
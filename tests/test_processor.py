@@ -0,0 +1,81 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from mltoolsbot.processor import ChatOrderedUpdateProcessor
+
+BACKEND_DELAY = 0.1
+CHATS = 5
+MESSAGES_PER_CHAT = 3
+
+
+def make_update(chat_id):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+async def run_benchmark(processor):
+    order = {chat_id: [] for chat_id in range(CHATS)}
+
+    async def slow_handler(chat_id, number):
+        await asyncio.sleep(BACKEND_DELAY)
+        order[chat_id].append(number)
+
+    start = time.perf_counter()
+    async with processor:
+        await asyncio.gather(
+            *(
+                processor.process_update(
+                    make_update(chat_id), slow_handler(chat_id, number)
+                )
+                for number in range(MESSAGES_PER_CHAT)
+                for chat_id in range(CHATS)
+            )
+        )
+    return time.perf_counter() - start, order
+
+
+class TestChatOrderedUpdateProcessor:
+    # Chats are served in parallel while each chat stays sequential.
+    @pytest.mark.asyncio
+    async def test_throughput_with_slow_backend(self):
+        sequential, _ = await run_benchmark(ChatOrderedUpdateProcessor(1))
+        concurrent, order = await run_benchmark(ChatOrderedUpdateProcessor(32))
+
+        assert concurrent < BACKEND_DELAY * (MESSAGES_PER_CHAT + 1)
+        assert sequential / concurrent > CHATS / 2
+        assert all(numbers == [0, 1, 2] for numbers in order.values())
+
+    # Per-chat locks are released once the chat has no pending updates.
+    @pytest.mark.asyncio
+    async def test_chat_locks_are_cleaned_up(self):
+        processor = ChatOrderedUpdateProcessor(4)
+
+        async def handler():
+            pass
+
+        await processor.process_update(make_update(1), handler())
+        assert processor._chats == {}
+
+    # Updates queued behind a busy chat do not hold slots other chats need.
+    @pytest.mark.asyncio
+    async def test_busy_chat_does_not_block_others(self):
+        processor = ChatOrderedUpdateProcessor(4)
+
+        async def handler(delay):
+            await asyncio.sleep(delay)
+
+        async with processor:
+            busy = [
+                asyncio.create_task(
+                    processor.process_update(make_update(1), handler(0.2))
+                )
+                for _ in range(4)
+            ]
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            await processor.process_update(make_update(2), handler(0))
+            assert time.perf_counter() - start < 0.1
+            await asyncio.gather(*busy)
+        assert processor.max_concurrent_updates == 4
@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from mltoolsbot.config import Config
+from mltoolsbot.exceptions import HandlerError, TimeoutError
+from mltoolsbot.providers import (
+    Provider,
+    ProviderRegistry,
+    YandexArtProvider,
+    YandexGPTProvider,
+)
+
+
+class EchoProvider(Provider):
+    name = Config.CLAUDE
+
+    async def _generate_text(self, system, messages):
+        return messages[-1]["content"]
+
+
+class FakeOperation:
+    """
+    Deferred generation of the Yandex Cloud ML SDK, finished or timing out
+    """
+
+    def __init__(self, timeout=False):
+        self.timeout = timeout
+        self.waits = []
+
+    async def wait(self, **kwargs):
+        self.waits.append(kwargs)
+        if self.timeout:
+            raise asyncio.TimeoutError()
+        return SimpleNamespace(image_bytes=b"png")
+
+
+class FakeArtModel:
+    def __init__(self, operation):
+        self.operation = operation
+        self.prompts = []
+
+    async def run_deferred(self, prompt):
+        self.prompts.append(prompt)
+        return self.operation
+
+
+class TestProviderRegistry:
+    # Commands resolve to the provider of their configured backend.
+    def test_for_command(self):
+        registry = ProviderRegistry()
+        provider = EchoProvider()
+        registry.register(provider)
+        assert registry.for_command(Config.SUMMARIZE) is provider
+        with pytest.raises(HandlerError):
+            registry.for_command(Config.YDX_LLM)
+        with pytest.raises(HandlerError):
+            registry.for_command("unknown")
+
+
+class TestProvider:
+    # Backends without streaming yield the whole response once.
+    @pytest.mark.asyncio
+    async def test_stream_falls_back_to_generate(self):
+        messages = [{"role": "user", "content": "Hi"}]
+        chunks = [text async for text in EchoProvider().stream_text("", messages)]
+        assert chunks == ["Hi"]
+
+    def test_yandex_messages(self):
+        messages = YandexGPTProvider._messages(
+            "Be brief", [{"role": "user", "content": "Hi"}]
+        )
+        assert messages == [
+            {"role": "system", "text": "Be brief"},
+            {"role": "user", "text": "Hi"},
+        ]
+
+
+class TestYandexArt:
+    # Polling of the deferred operation uses the configured timeout and interval.
+    @pytest.mark.asyncio
+    async def test_polling_settings(self, monkeypatch):
+        monkeypatch.setattr(Config, "YDX_ART_TIMEOUT", 90.0)
+        monkeypatch.setattr(Config, "YDX_ART_POLL_INTERVAL", 0.5)
+        provider = YandexArtProvider()
+        provider.model = FakeArtModel(FakeOperation())
+
+        assert await provider.generate_image("cat") == b"png"
+        assert provider.model.prompts == ["cat"]
+        assert provider.model.operation.waits == [
+            {"poll_timeout": 90, "poll_interval": 0.5}
+        ]
+        # The SDK takes whole seconds
+        assert type(provider.model.operation.waits[0]["poll_timeout"]) is int
+
+    # Running out of polling time is reported as the bot's timeout.
+    @pytest.mark.asyncio
+    async def test_poll_timeout(self):
+        provider = YandexArtProvider()
+        provider.model = FakeArtModel(FakeOperation(timeout=True))
+
+        with pytest.raises(TimeoutError):
+            await provider.generate_image("cat")
+        assert len(provider.model.operation.waits) == 1
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from mltoolsbot.config import Config
+from mltoolsbot.redis import AsyncRedisClient
+
+
+async def read_command(reader):
+    """Parse a RESP array of bulk strings."""
+    count = int((await reader.readline())[1:])
+    args = []
+    for _ in range(count):
+        size = int((await reader.readline())[1:])
+        args.append((await reader.readexactly(size + 2))[:-2].decode())
+    return args
+
+
+def bulk_array(*items):
+    encoded = b"".join(
+        (
+            b":%d\r\n" % item
+            if isinstance(item, int)
+            else b"$%d\r\n%s\r\n" % (len(item.encode()), item.encode())
+        )
+        for item in items
+    )
+    return b"*%d\r\n" % len(items) + encoded
+
+
+class TestListen:
+    # A channel quiet for longer than the socket timeout keeps its subscriber.
+    @pytest.mark.asyncio
+    async def test_quiet_channel(self, monkeypatch):
+        subscribed = asyncio.Event()
+        writers = []
+
+        async def serve(reader, writer):
+            writers.append(writer)
+            subscriber = False
+            while True:
+                try:
+                    command = await read_command(reader)
+                except (asyncio.IncompleteReadError, ValueError):
+                    return
+                name = command[0].upper()
+                if name == "SUBSCRIBE":
+                    writer.write(bulk_array("subscribe", command[1], 1))
+                    subscriber = True
+                    subscribed.set()
+                elif name == "PING" and subscriber:
+                    writer.write(bulk_array("pong", ""))
+                elif name == "PING":
+                    writer.write(b"+PONG\r\n")
+                else:
+                    writer.write(b"+OK\r\n")
+                await writer.drain()
+
+        server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        monkeypatch.setattr(Config, "REDIS_HOST", "127.0.0.1")
+        monkeypatch.setattr(Config, "REDIS_PORT", port)
+        monkeypatch.setattr(Config, "REDIS_SOCKET_TIMEOUT", 0.1)
+        monkeypatch.setattr(Config, "REDIS_HEALTH_CHECK_INTERVAL", 0.1)
+        received = []
+        listener = asyncio.create_task(
+            AsyncRedisClient().listen("auth", received.append)
+        )
+        await asyncio.wait_for(subscribed.wait(), 1)
+        await asyncio.sleep(0.5)
+        writers[-1].write(bulk_array("message", "auth", "42"))
+        await asyncio.sleep(0.2)
+
+        assert not listener.done()
+        assert received == ["42"]
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        server.close()
@@ -0,0 +1,113 @@
+import httpx
+import pytest
+
+from mltoolsbot.config import Config
+from mltoolsbot.exceptions import CircuitOpenError
+from mltoolsbot.providers import Provider
+from mltoolsbot.resilience import CircuitBreaker, RetryPolicy
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+class FlakyProvider(Provider):
+    name = Config.OLLAMA
+    retry = RetryPolicy(attempts=3, base_delay=0.01)
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def _generate_text(self, system, messages):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    async def _stream_text(self, system, messages):
+        self.calls += 1
+        yield "partial"
+        if self.errors:
+            raise self.errors.pop(0)
+
+
+def connect_error():
+    return httpx.ConnectError("refused", request=httpx.Request("GET", "http://sd"))
+
+
+class TestRetryPolicy:
+    # Delays grow exponentially but are jittered and capped.
+    def test_delay(self):
+        policy = RetryPolicy(attempts=5, base_delay=1, max_delay=3)
+        assert all(0 <= policy.delay(1) <= 1 for _ in range(100))
+        assert all(0 <= policy.delay(4) <= 3 for _ in range(100))
+        assert policy.delay(5) is None
+
+
+class TestCircuitBreaker:
+    # Circuit opens after consecutive failures and closes after a good trial.
+    def test_open_and_recover(self, monkeypatch):
+        breaker = CircuitBreaker("sd", failure_threshold=2, reset_timeout=10)
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                with breaker.call(lambda e: True):
+                    raise ValueError
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            with breaker.call(lambda e: True):
+                pass
+
+        monkeypatch.setattr(breaker, "opened_at", breaker.opened_at - 10)
+        assert breaker.state == "half-open"
+        with breaker.call(lambda e: True):
+            # Only the trial call passes while half-open
+            assert breaker.state == "open"
+        assert breaker.state == "closed"
+
+
+class TestProviderRetry:
+    # Transient errors are retried, others fail immediately.
+    @pytest.mark.asyncio
+    async def test_retry_transient(self):
+        provider = FlakyProvider([connect_error(), connect_error()])
+        assert await provider.generate_text("", MESSAGES) == "ok"
+        assert provider.calls == 3
+
+        provider = FlakyProvider([ValueError("bad request")])
+        with pytest.raises(ValueError):
+            await provider.generate_text("", MESSAGES)
+        assert provider.calls == 1
+
+    # Streams are not retried once text has been delivered.
+    @pytest.mark.asyncio
+    async def test_stream_not_retried_after_output(self):
+        provider = FlakyProvider([connect_error()])
+        with pytest.raises(httpx.ConnectError):
+            async for _ in provider.stream_text("", MESSAGES):
+                pass
+        assert provider.calls == 1
+
+    # A failing backend is not called while its circuit is open.
+    @pytest.mark.asyncio
+    async def test_circuit_fast_fails(self):
+        provider = FlakyProvider([connect_error()] * 10)
+        provider.breaker.failure_threshold = 3
+        with pytest.raises(httpx.ConnectError):
+            await provider.generate_text("", MESSAGES)
+        with pytest.raises(CircuitOpenError):
+            await provider.generate_text("", MESSAGES)
+        assert provider.calls == 3
+
+    # Health probe opens the circuit while failing and closes it on recovery.
+    @pytest.mark.asyncio
+    async def test_probe(self, monkeypatch):
+        provider = FlakyProvider([])
+
+        async def failing():
+            raise connect_error()
+
+        monkeypatch.setattr(provider, "_probe", failing)
+        await provider.probe()
+        assert provider.breaker.state == "open"
+        monkeypatch.undo()
+        await provider.probe()
+        assert provider.breaker.state == "closed"
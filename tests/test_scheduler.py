@@ -0,0 +1,124 @@
+import asyncio
+import time
+
+import pytest
+
+from mltoolsbot import deadline
+from mltoolsbot.exceptions import RateLimitError, TimeoutError
+from mltoolsbot.scheduler import AdmissionController
+
+
+class TestAdmissionController:
+    # Users over their token bucket are rejected.
+    @pytest.mark.asyncio
+    async def test_user_rate_limit(self):
+        admission = AdmissionController(
+            user_rate=2, user_period=60, backend_limits={"llm": 4}
+        )
+        for _ in range(2):
+            async with admission.admit("1", "llm"):
+                pass
+        with pytest.raises(RateLimitError):
+            async with admission.admit("1", "llm"):
+                pass
+        async with admission.admit("2", "llm"):
+            pass
+        assert admission.stats()["rejected"] == 1
+
+    # Backend concurrency is bounded and queued requests learn their position.
+    @pytest.mark.asyncio
+    async def test_backend_concurrency_and_queue_position(self):
+        admission = AdmissionController(
+            user_rate=10, user_period=60, backend_limits={"img": 1, "llm": 1}
+        )
+        positions = []
+        running = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        async def request(user_id, backend):
+            async with admission.admit(user_id, backend, on_queued):
+                running.append(backend)
+                assert running.count(backend) == 1
+                await asyncio.sleep(0.05)
+                running.remove(backend)
+
+        await asyncio.gather(
+            *(request(str(i), "img") for i in range(3)), request("9", "llm")
+        )
+        stats = admission.stats()
+        assert positions == [1, 2]
+        assert stats["wait"]["img"]["count"] == 3
+        assert stats["wait"]["img"]["max"] >= 0.1
+        assert stats["waiting"] == {"img": 0, "llm": 0}
+
+    # A flooding user does not delay others, text overtakes image requests.
+    @pytest.mark.asyncio
+    async def test_weighted_fair_order(self):
+        admission = AdmissionController(
+            user_rate=10,
+            user_period=60,
+            backend_limits={"llm": 1, "img": 1},
+            global_limit=1,
+            kind_costs={"text": 1, "image": 10},
+        )
+        order = []
+
+        async def request(user_id, backend="llm", kind="text", weight=1):
+            async with admission.admit(user_id, backend, kind=kind, weight=weight):
+                order.append(user_id)
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(request("spam")) for _ in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("img", "img", "image")))
+        tasks.append(asyncio.create_task(request("vip", weight=5)))
+        tasks.append(asyncio.create_task(request("user")))
+        await asyncio.gather(*tasks)
+
+        assert order[:4] == ["spam", "vip", "user", "spam"]
+        assert order.index("img") > order.index("user")
+        stats = admission.stats()["kind_wait"]
+        assert stats["text"]["count"] == 7
+        assert stats["text"]["p50"] <= stats["text"]["p99"] <= stats["text"]["max"]
+
+    # A request leaves the queue when the update's budget runs out.
+    @pytest.mark.asyncio
+    async def test_queue_wait_bounded_by_budget(self):
+        admission = AdmissionController(
+            user_rate=10, user_period=60, backend_limits={"img": 1}
+        )
+
+        async def busy():
+            async with admission.admit("1", "img"):
+                await asyncio.sleep(1)
+
+        holder = asyncio.create_task(busy())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        with pytest.raises(TimeoutError), deadline.budget(0.1):
+            async with admission.admit("2", "img"):
+                pass
+        assert time.perf_counter() - start < 0.5
+        assert admission.queue == [] and admission.stats()["waiting"] == {"img": 0}
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+        assert admission.stats()["in_flight"] == {"img": 0}
+
+    # A failure to report the queue position does not abort the request.
+    @pytest.mark.asyncio
+    async def test_on_queued_failure_is_ignored(self):
+        admission = AdmissionController(
+            user_rate=10, user_period=60, backend_limits={"img": 1}
+        )
+
+        async def on_queued(position):
+            raise RuntimeError("message to edit not found")
+
+        async def request(user_id):
+            async with admission.admit(user_id, "img", on_queued):
+                await asyncio.sleep(0.01)
+            return user_id
+
+        assert await asyncio.gather(request("1"), request("2")) == ["1", "2"]
@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+from mltoolsbot.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    # Concurrent calls with the same key share one execution.
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_are_coalesced(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def backend():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", backend) for _ in range(5)))
+        assert calls == [1]
+        assert [shared for _, shared in results] == [False] + [True] * 4
+        assert flight.stats() == {"calls": 1, "saved": 4, "in_flight": 0}
+
+    # Errors are delivered to every waiter and the key is released.
+    @pytest.mark.asyncio
+    async def test_errors_are_shared(self):
+        flight = SingleFlight()
+
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("backend down")
+
+        results = await asyncio.gather(
+            flight.do("key", failing), flight.do("key", failing), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+        assert len(flight) == 0
+
+    # A waiter takes over when the caller running the call is cancelled.
+    @pytest.mark.asyncio
+    async def test_cancelled_leader_is_replaced(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def backend():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        leader = asyncio.create_task(flight.do("key", backend))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("key", backend))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+
+        assert await waiter == ("result", False)
+        assert leader.cancelled()
+        assert calls == [1, 1]
+        assert len(flight) == 0
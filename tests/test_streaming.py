@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from mltoolsbot.streaming import StreamingMessage, stream_text
+from tests.fakes import FakeBot
+
+
+async def tokens(count, delay=0.0):
+    text = ""
+    for i in range(count):
+        text += f"t{i} "
+        if delay:
+            time.sleep(delay)
+        yield text
+
+
+class TestStreamText:
+    # First token is sent right away and the final text always lands.
+    @pytest.mark.asyncio
+    async def test_first_token_and_final_text(self):
+        bot = FakeBot()
+        result = await stream_text(bot, 1, tokens(50))
+        assert bot.sent[0] == (1, "t0 ")
+        assert bot.edits[-1] == (1, 1, result)
+
+    # Edits are coalesced to at most one per interval.
+    @pytest.mark.asyncio
+    async def test_edits_are_throttled(self):
+        bot = FakeBot()
+        message = StreamingMessage(bot, 1, interval=0.05)
+        async for text in tokens(30, delay=0.01):
+            await message.update(text)
+        await message.finish()
+        assert len(bot.sent) == 1
+        assert 2 <= len(bot.edits) <= 8
+
+    # Long responses are split over several messages.
+    @pytest.mark.asyncio
+    async def test_long_response_is_split(self):
+        bot = FakeBot()
+
+        async def long_text():
+            yield "a" * 5000
+
+        await stream_text(bot, 1, long_text())
+        assert [len(text) for _, text in bot.sent] == [4096, 904]
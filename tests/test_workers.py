@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from mltoolsbot.processor import ChatOrderedUpdateProcessor
+from mltoolsbot.workers import UpdateStream, run_worker
+
+
+def message_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "text": f"message {update_id}",
+        },
+    }
+
+
+class FakeUpdateStream(UpdateStream):
+    def __init__(self, entries, stop_event):
+        super().__init__(redis_client=None, partitions=4)
+        self.entries = entries
+        self.stop_event = stop_event
+        self.acked = []
+
+    async def create_groups(self, partitions):
+        pass
+
+    async def read(self, consumer, partitions, pending, block):
+        if pending:
+            return []
+        entries, self.entries = self.entries, []
+        if not entries:
+            self.stop_event.set()
+        return entries
+
+    async def ack(self, stream, entry_id):
+        self.acked.append(entry_id)
+
+
+class FakeApplication:
+    post_init = None
+    post_shutdown = None
+    bot = None
+
+    def __init__(self):
+        self.update_processor = ChatOrderedUpdateProcessor(8)
+        self.processed = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def process_update(self, update):
+        await asyncio.sleep(0.01 * (update.update_id % 3))
+        self.processed.append((update.effective_chat.id, update.update_id))
+
+
+class TestUpdateStream:
+    # Every partition is owned by exactly one worker.
+    def test_partitions_are_split_between_workers(self):
+        stream = UpdateStream(redis_client=None, partitions=16)
+        owned = [p for w in range(3) for p in stream.worker_partitions(w, 3)]
+        assert sorted(owned) == list(range(16))
+
+    # Worker processes and acknowledges entries keeping per-chat order.
+    @pytest.mark.asyncio
+    async def test_worker_keeps_chat_order(self):
+        stop_event = asyncio.Event()
+        entries = [
+            ("updates:0", f"{i}-0", message_update(i, chat_id=i % 2))
+            for i in range(1, 11)
+        ]
+        stream = FakeUpdateStream(entries, stop_event)
+        application = FakeApplication()
+        await run_worker(application, stream, 0, 1, stop_event)
+
+        assert len(stream.acked) == 10
+        for chat_id in (0, 1):
+            ids = [u for c, u in application.processed if c == chat_id]
+            assert ids == sorted(ids)